@@ -1,12 +1,36 @@
 #!/usr/bin/env python
 from __future__ import print_function
-from .tabulate import tabulate as tabulate_
 import sys
-import pandas as pd
+import os
+import importlib
 import re
 import datetime
 
 
+class _LazyModule(object):
+    """Stand-in for a module, imported on first attribute access.
+
+    Importing pandas dominates the startup time of ph, and commands like
+    `ph help`, `ph --version` and `ph columns` do not need it.
+
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+
+pd = _LazyModule("pandas")
+
+
+def tabulate_(*args, **kwargs):
+    from .tabulate import tabulate
+
+    return tabulate(*args, **kwargs)
+
+
 def _get_version():
     import ph._version
 
@@ -61,98 +85,324 @@ def _gpx(fname):
 
 def _tsv(*args, **kwargs):
     kwargs["sep"] = "\t"
-    return pd.read_csv(*args, **kwargs)
+    return _read_csv(*args, **kwargs)
 
 
-# These are all lambdas because they lazy load, and some of these
-# readers are introduced in later pandas.
-READERS = {
-    "csv": pd.read_csv,
-    "clipboard": pd.read_clipboard,
-    "fwf": pd.read_fwf,
-    "json": pd.read_json,
-    "html": pd.read_html,
-    "tsv": _tsv,
-    "gpx": _gpx,
-}
+def _read_csv(source, **kwargs):
+    """pd.read_csv with the parser chosen with --engine (or PH_ENGINE).
 
-try:
-    READERS["excel"] = pd.read_excel
-    READERS["xls"] = pd.read_excel
-    READERS["odf"] = pd.read_excel
-except AttributeError:
-    pass
+    The pyarrow engine parses with several threads and, with pandas 2, keeps
+    the columns in Arrow types.  It takes the options sep, chunksize, nrows
+    and a dtype of floats or text per column; with other options, and
+    without pyarrow, the default parser is used.
 
-try:
-    READERS["hdf5"] = pd.read_hdf
-except AttributeError:
-    pass
+    """
+    import io
+
+    engine = _engine()
+    options = _arrow_options(kwargs) if engine == "pyarrow" else None
+    if engine == "pyarrow" and options is None:
+        _warn(
+            "ph: --engine=pyarrow does not take {}, using the default parser".format(
+                ", ".join(sorted(kwargs))
+            )
+        )
+    elif engine == "pyarrow":
+        try:
+            import pyarrow  # noqa
+        except ImportError:
+            pass
+        else:
+            if kwargs.get("chunksize"):
+                return _read_arrow_chunks(source, kwargs["chunksize"], **options)
+            if kwargs.get("nrows") is not None:
+                chunks = _read_arrow_chunks(source, max(kwargs["nrows"], 1), **options)
+                try:
+                    return next(iter(chunks)).iloc[: kwargs["nrows"]]
+                except _TypesChanged:
+                    sys.exit(_ARROW_TYPES_CHANGED)
+            if not isinstance(source, str):
+                data = getattr(source, "buffer", source).read()
+                if isinstance(data, str):
+                    data = data.encode("utf-8")
+                source = io.BytesIO(data)
+            df = _read_arrow_csv(source, **options)
+            if df is not None:
+                return df
+            if not isinstance(source, str):
+                source.seek(0)
+    elif engine in ("c", "python"):
+        kwargs["engine"] = engine
+    return pd.read_csv(source, **kwargs)
+
+
+def _arrow_options(kwargs):
+    """The options of _read_arrow_csv for the options of pd.read_csv.
+
+    Returns None for options that pyarrow does not take.
 
+    """
+    if set(kwargs) - {"sep", "chunksize", "nrows", "dtype"}:
+        return None
+    options = {"sep": kwargs.get("sep", ",")}
+    dtype = kwargs.get("dtype") or {}
+    if not isinstance(dtype, dict):
+        return None
+    if dtype:
+        import pyarrow
+
+        options["types"] = {}
+        for col, value in dtype.items():
+            value = pd.api.types.pandas_dtype(value)
+            if value.kind == "f":
+                options["types"][col] = pyarrow.float64()
+            elif value.kind == "O":
+                options["types"][col] = pyarrow.string()
+            else:
+                return None
+    return options
 
-try:
-    READERS["feather"] = pd.read_feather
-except AttributeError:
-    pass
 
+_WARNED = set()
 
-try:
-    READERS["parquet"] = pd.read_parquet
-except AttributeError:
-    pass
 
+def _warn(message):
+    """Print message to standard error, once."""
+    if message not in _WARNED:
+        _WARNED.add(message)
+        print(message, file=sys.stderr)
 
-try:
-    READERS["orc"] = pd.read_orc
-except AttributeError:
-    pass
 
+def _arrow_csv_options(sep, types):
+    """The parse and convert options of pyarrow.csv, to parse like pd.read_csv."""
+    import pyarrow.csv
 
-try:
-    READERS["msgpack"] = pd.read_msgpack
-except AttributeError:
-    pass
+    return {
+        "parse_options": pyarrow.csv.ParseOptions(
+            delimiter=sep, newlines_in_values=True
+        ),
+        "convert_options": pyarrow.csv.ConvertOptions(
+            strings_can_be_null=True, column_types=types
+        ),
+    }
+
+
+def _read_arrow_csv(source, sep=",", types=None):
+    """Parse a csv file, a path or a binary file, with pyarrow.csv.
+
+    Follows pd.read_csv: newlines may be quoted, empty strings are missing
+    values and dates are not parsed.  types are the pyarrow types of some
+    columns.  Returns None if pyarrow cannot parse the file, e.g. as rows
+    have more fields than the header, and for headers that pandas would
+    rename, with empty or duplicate names.
+
+    """
+    import pyarrow
+    import pyarrow.csv
+
+    def read(more):
+        if not isinstance(source, str):
+            source.seek(0)
+        options = _arrow_csv_options(sep, dict(types or {}, **more))
+        return pyarrow.csv.read_csv(source, **options)
+
+    try:
+        table = read({})
+        names = table.column_names
+        if not all(names) or len(set(names)) < len(names):
+            return None
+        dates = _arrow_dates(table.schema)
+        if dates:
+            table = read(dates)
+    except pyarrow.ArrowInvalid:
+        return None
+    return _arrow_frame(table)
+
+
+def _arrow_dates(schema):
+    """String types for the columns that pyarrow parsed as dates."""
+    import pyarrow
+
+    return {
+        field.name: pyarrow.string()
+        for field in schema
+        if pyarrow.types.is_temporal(field.type)
+    }
 
 
-try:
-    READERS["stata"] = pd.read_stata
-except AttributeError:
-    pass
+def _arrow_frame(table):
+    """The pyarrow Table table as a DataFrame, as pd.read_csv would give it.
 
+    Columns of only missing values are floats, or text without any rows,
+    and missing text is NaN, not None.  With pandas 2 the columns keep their
+    Arrow types instead.
 
-try:
-    READERS["sas"] = pd.read_sas
-except AttributeError:
-    pass
+    """
+    import numpy
+    import pyarrow
+
+    if int(pd.__version__.split(".")[0]) >= 2:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    for idx, field in enumerate(table.schema):
+        if pyarrow.types.is_null(field.type) and len(table):
+            column = table.column(idx).cast(pyarrow.float64())
+            table = table.set_column(idx, field.name, column)
+    df = table.to_pandas()
+    return _set_columns(
+        df,
+        {
+            idx: df.iloc[:, idx].where(df.iloc[:, idx].notna(), numpy.nan)
+            for idx, dtype in enumerate(df.dtypes)
+            if dtype == object
+        },
+    )
 
 
-try:
-    READERS["spss"] = pd.read_spss
-except AttributeError:
-    pass
+def _read_arrow_chunks(source, chunksize, sep=",", types=None):
+    """Parse like _read_arrow_csv, in DataFrames of chunksize rows.
 
+    The input is read in blocks, and pyarrow takes the column types of the
+    first block for all of them, so a later block of other types raises
+    _TypesChanged.  Input that pyarrow cannot parse, as _read_arrow_csv,
+    is parsed by pd.read_csv.
 
-try:
-    READERS["pickle"] = pd.read_pickle
-except AttributeError:
-    pass
+    """
+    import pyarrow
+    import pyarrow.csv
 
+    stream = source if isinstance(source, str) else _ArrowInput(source)
 
-try:
-    READERS["gbq"] = pd.read_gbq
-except AttributeError:
-    pass
+    def open_csv(more):
+        if not isinstance(stream, str):
+            stream.rewind()
+        options = _arrow_csv_options(sep, dict(types or {}, **more))
+        return pyarrow.csv.open_csv(stream, **options)
 
+    try:
+        reader = open_csv({})
+        names = reader.schema.names
+        if not all(names) or len(set(names)) < len(names):
+            raise pyarrow.ArrowInvalid("names that pandas would rename")
+        dates = _arrow_dates(reader.schema)
+        if dates:
+            reader = open_csv(dates)
+    except pyarrow.ArrowInvalid:
+        if not isinstance(stream, str):
+            stream.rewind()
+            stream.forget()
+        return pd.read_csv(stream, sep=sep, chunksize=chunksize)
+    if not isinstance(stream, str):
+        stream.forget()
+    return _arrow_chunks(reader, reader.schema, chunksize)
+
+
+def _arrow_chunks(batches, schema, chunksize, frame=_arrow_frame):
+    """The record batches of schema as DataFrames of chunksize rows.
+
+    frame makes a DataFrame of a Table.  The index runs on from chunk to
+    chunk, as with pd.read_csv.
 
-try:
-    READERS["google"] = pd.read_gbq
-except AttributeError:
-    pass
+    """
+    import pyarrow
 
+    def chunk(table):
+        df = frame(table)
+        df.index = pd.RangeIndex(start, start + len(df))
+        return df
 
-try:
-    READERS["bigquery"] = pd.read_gb
-except AttributeError:
-    pass
+    table, start = schema.empty_table(), 0
+    try:
+        for batch in batches:
+            table = pyarrow.concat_tables([table, pyarrow.Table.from_batches([batch])])
+            while len(table) >= chunksize:
+                yield chunk(table.slice(0, chunksize))
+                table, start = table.slice(chunksize), start + chunksize
+    except pyarrow.ArrowInvalid:
+        raise _TypesChanged()
+    if len(table) or not start:
+        yield chunk(table)
+
+
+class _ArrowInput(object):
+    """A stream as the binary file that pyarrow.csv.open_csv reads.
+
+    Text is encoded as utf-8.  What is read is kept, and read again after
+    rewind(), until forget() is called.
+
+    """
+
+    closed = False
+
+    def __init__(self, stream):
+        self.stream = getattr(stream, "buffer", stream)
+        self.seen, self.rest = [], b""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data, length = [self.rest], len(self.rest)
+        while size < 0 or length < size:
+            more = self.stream.read(size - length if size >= 0 else -1)
+            if not more:
+                break
+            if isinstance(more, str):
+                more = more.encode("utf-8")
+            data.append(more)
+            length += len(more)
+        data = b"".join(data)
+        if size >= 0:
+            data, self.rest = data[:size], data[size:]
+        else:
+            self.rest = b""
+        if self.seen is not None:
+            self.seen.append(data)
+        return data
+
+    def rewind(self):
+        """Read from the start again."""
+        self.rest = b"".join(self.seen) + self.rest
+        self.seen = []
+
+    def forget(self):
+        """Stop keeping what is read."""
+        self.seen = None
+
+
+def _lazy_reader(name):
+    def reader(*args, **kwargs):
+        return getattr(pd, name)(*args, **kwargs)
+
+    reader.__name__ = name
+    return reader
+
+
+# These are all lazy because importing pandas is slow, and some of these
+# readers are introduced in later pandas (an AttributeError is raised on use).
+READERS = {
+    "csv": _read_csv,
+    "clipboard": _lazy_reader("read_clipboard"),
+    "fwf": _lazy_reader("read_fwf"),
+    "json": _lazy_reader("read_json"),
+    "html": _lazy_reader("read_html"),
+    "tsv": _tsv,
+    "gpx": _gpx,
+    "excel": _lazy_reader("read_excel"),
+    "xls": _lazy_reader("read_excel"),
+    "odf": _lazy_reader("read_excel"),
+    "hdf5": _lazy_reader("read_hdf"),
+    "feather": _lazy_reader("read_feather"),
+    "parquet": _lazy_reader("read_parquet"),
+    "orc": _lazy_reader("read_orc"),
+    "msgpack": _lazy_reader("read_msgpack"),
+    "stata": _lazy_reader("read_stata"),
+    "sas": _lazy_reader("read_sas"),
+    "spss": _lazy_reader("read_spss"),
+    "pickle": _lazy_reader("read_pickle"),
+    "gbq": _lazy_reader("read_gbq"),
+    "google": _lazy_reader("read_gbq"),
+    "bigquery": _lazy_reader("read_gbq"),
+}
 
 
 WRITERS = {
@@ -184,6 +434,107 @@ FALSY = ("False", "false", "No", "no", "0", False, 0, "None")
 TRUTHY = ("True", "true", "Yes", "yes", "1", True, 1)
 
 
+# Options for all commands, given as --name=value anywhere on the command
+# line or as the environment variable PH_NAME.
+OPTIONS = {}
+OPTION_DEFAULTS = {
+    "chunksize": 100000,  # rows per chunk for streaming commands, 0 disables
+    "jobs": 1,  # processes parsing a csv file, 0 for one per core
+    "engine": None,  # csv parser, c, python or pyarrow, None for pandas' default
+    "lazy": False,  # streaming commands parse only the columns they use
+    "float-format": None,  # printf format of floats in csv output, e.g. %.3f
+}
+
+
+def _option(name):
+    if name in OPTIONS:
+        return OPTIONS[name]
+    env = os.environ.get("PH_" + name.upper().replace("-", "_"))
+    if env is not None:
+        return __tryparse(env)
+    return OPTION_DEFAULTS.get(name)
+
+
+def _chunksize():
+    chunksize = _option("chunksize")
+    if not isinstance(chunksize, int) or chunksize < 0:
+        sys.exit("--chunksize must be a non-negative int, not {}".format(chunksize))
+    return chunksize
+
+
+def _jobs():
+    jobs = _option("jobs")
+    if not isinstance(jobs, int) or isinstance(jobs, bool) or jobs < 0:
+        sys.exit("--jobs must be a non-negative int, not {}".format(jobs))
+    return jobs or os.cpu_count() or 1
+
+
+def _engine():
+    engine = _option("engine")
+    if engine not in (None, "c", "python", "pyarrow"):
+        sys.exit("--engine must be one of c, python or pyarrow, not {}".format(engine))
+    return engine
+
+
+def _lazy():
+    lazy = _option("lazy")
+    if lazy not in TRUTHY and lazy not in FALSY:
+        sys.exit("--lazy must be True or False, not {}".format(lazy))
+    return lazy in TRUTHY
+
+
+def _compact_frame(df):
+    """df in smaller column types that write the same csv.
+
+    Ints are downcast, floats become float32 if every value prints the same,
+    columns of text with at most half as many distinct values as rows become
+    categories, and floats that are mostly NaN become sparse.
+
+    """
+    import numpy
+
+    columns = {}
+    for idx, dtype in enumerate(df.dtypes):
+        col = df.iloc[:, idx]
+        if not isinstance(dtype, numpy.dtype):
+            continue
+        if dtype.kind in "iu":
+            col = pd.to_numeric(col, downcast="integer")
+        elif dtype.kind == "f":
+            if dtype.itemsize > 4:
+                small = col.astype("float32")
+                if ((small.astype(dtype) == col) | col.isna()).all() and small.astype(
+                    str
+                ).equals(col.astype(str)):
+                    col = small
+            if col.isna().sum() * 2 > len(col):
+                sparse = col.astype(pd.SparseDtype(col.dtype))
+                if sparse.memory_usage() < col.memory_usage():
+                    col = sparse
+        elif dtype == object:
+            if pd.api.types.infer_dtype(col) != "string":
+                continue
+            if col.nunique() * 2 <= len(col):
+                col = col.astype("category")
+        columns[idx] = col
+    return _set_columns(df, columns)
+
+
+def _float_format():
+    fmt = _option("float-format")
+    if fmt is None or fmt == "shortest":
+        return None
+    try:
+        if not isinstance(fmt, str) or not isinstance(fmt % 1.5, str):
+            raise TypeError(fmt)
+    except (TypeError, ValueError):
+        sys.exit(
+            "--float-format must be shortest or a format such as %.3f or %g, "
+            "not {}".format(fmt)
+        )
+    return fmt
+
+
 def _assert_col(df, col, caller=None):
     if col not in df.columns:
         if caller is not None:
@@ -269,10 +620,199 @@ def dataset(dset=None):
 
 
 @register
-def drop_duplicates(*cols):
-    """Drop duplicates"""
-    df = pipein()
-    pipeout(df.drop_duplicates(cols))
+def drop_duplicates(*cols, keep="first", approx=None):
+    """Drop duplicate rows, or rows with duplicate values in the given columns.
+
+    Rows are hashed chunk by chunk and only the 64-bit hashes of the first
+    occurrences are kept, so memory grows with the number of distinct rows,
+    at about 16 bytes each, not with their size.  Rows are not compared
+    themselves, so a row whose hash collides with that of an earlier row is
+    dropped, which happens to about one in 10**19 pairs of rows.  The chunks
+    have the column types of all input, see _typed_chunks, and the kept rows
+    are written chunk by chunk.
+
+    Argument: --keep=first
+
+    Which of the duplicates to keep, first, last or False (none of them).
+    Only first streams, the others read all input at once.
+
+    Argument: --approx or --approx=64M
+
+    Remember the rows in a Bloom filter of the given size instead, so memory
+    is fixed.  A row is then wrongly dropped as a duplicate with a
+    probability of about 1% once the filter holds one row per 10 bits.
+
+    Usage: cat a.csv | ph drop_duplicates
+           cat a.csv | ph drop_duplicates x y
+           cat a.csv | ph drop_duplicates x --keep=last
+           cat huge.csv | ph drop_duplicates --approx=1G
+
+    """
+    import itertools
+
+    if "--approx" in cols:
+        cols = tuple(col for col in cols if col != "--approx")
+        approx = "64M" if approx is None else approx
+    if keep in FALSY:
+        keep = False
+    if keep not in ("first", "last", False):
+        sys.exit("--keep must be one of first, last or False, not {}".format(keep))
+    if approx is not None:
+        if keep != "first":
+            sys.exit("--approx only works with --keep=first")
+        approx = _parse_size(approx, "approx")
+
+    if keep != "first":
+        df = pipein()
+        keys = list(cols) if cols else list(df.columns)
+        _assert_cols(df, keys, "drop_duplicates")
+        pipeout(df.drop_duplicates(keys, keep=keep))
+        return
+    chunks = _typed_chunks()
+    df = next(chunks)
+    keys = list(cols) if cols else list(df.columns)
+    _assert_cols(df, keys, "drop_duplicates")
+    second = next(chunks, None)
+    if second is None and approx is None:
+        pipeout(df.drop_duplicates(keys, keep=keep))
+        return
+
+    seen = _HashSet() if approx is None else _BloomFilter(8 * approx)
+
+    def first_rows(chunk):
+        hashes = _row_hashes(chunk[keys])
+        first = ~pd.Series(hashes).duplicated().to_numpy()
+        first[first] = seen.add(hashes[first])
+        return chunk[first]
+
+    rest = [] if second is None else [second]
+    chunks = itertools.chain([df], rest, chunks)
+    _pipeout_chunks(first_rows(chunk) for chunk in chunks)
+
+
+def _row_hashes(df):
+    """64-bit hashes of the rows of df that agree between chunks.
+
+    A number is hashed as a pair, its value as an integer and, if it is not
+    whole, the bits of the float, so 3 hashes the same in a chunk where the
+    column is int64 as in one where it is float64.
+
+    """
+    import numpy
+
+    parts = {}
+    for idx, col in enumerate(df.columns):
+        values = df[col]
+        if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(
+            values
+        ):
+            parts[2 * idx] = values.to_numpy()
+            continue
+        if pd.api.types.is_integer_dtype(values):
+            parts[2 * idx] = values.to_numpy().astype("int64").view("uint64")
+            parts[2 * idx + 1] = numpy.zeros(len(values), dtype="uint64")
+            continue
+        floats = values.to_numpy(dtype="float64", copy=True)
+        floats[numpy.isnan(floats)] = numpy.nan
+        whole = (numpy.floor(floats) == floats) & (numpy.abs(floats) < 2.0**63)
+        ints = numpy.where(whole, floats, 0).astype("int64")
+        parts[2 * idx] = ints.view("uint64")
+        parts[2 * idx + 1] = numpy.where(whole, 0, floats.view("uint64"))
+    frame = pd.DataFrame(parts, index=df.index)
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+class _HashSet(object):
+    """A set of 64-bit hashes in an open addressing table of 8 byte slots.
+
+    The table is kept between a third and three quarters full, 0 marks an
+    empty slot, so whether the hash 0 is in the set is kept in `zero`.
+
+    """
+
+    def __init__(self, size=1 << 16):
+        import numpy
+
+        self.table = numpy.zeros(size, dtype=numpy.uint64)
+        self.count = 0
+        self.zero = False
+
+    def add(self, hashes):
+        """Add the distinct hashes, return which were not in the set yet."""
+        import numpy
+
+        zero = hashes == 0
+        if zero.any():
+            new = numpy.zeros(len(hashes), dtype=bool)
+            new[zero] = not self.zero
+            self.zero = True
+            new[~zero] = self.add(hashes[~zero])
+            return new
+        if 4 * (self.count + len(hashes)) > 3 * len(self.table):
+            self._grow(self.count + len(hashes))
+        new = numpy.zeros(len(hashes), dtype=bool)
+        mask = numpy.uint64(len(self.table) - 1)
+        slots = hashes & mask
+        todo = numpy.arange(len(hashes))
+        # Linear probing, all hashes a step at a time.  Of the hashes that
+        # claim the same free slot, the last written wins and the others
+        # look at the slot again.
+        while len(todo):
+            current = self.table[slots[todo]]
+            free = current == 0
+            claim = todo[free]
+            self.table[slots[claim]] = hashes[claim]
+            won = numpy.zeros(len(todo), dtype=bool)
+            won[free] = self.table[slots[claim]] == hashes[claim]
+            new[todo[won]] = True
+            done = won | (current == hashes[todo])
+            step = todo[~free & ~done]
+            slots[step] = (slots[step] + numpy.uint64(1)) & mask
+            todo = todo[~done]
+        self.count += int(new.sum())
+        return new
+
+    def _grow(self, count):
+        import numpy
+
+        old = self.table[self.table != 0]
+        size = len(self.table)
+        while 4 * count > 3 * size:
+            size *= 2
+        self.table = numpy.zeros(size, dtype=numpy.uint64)
+        self.count = 0
+        self.add(old)
+
+
+class _BloomFilter(object):
+    """An approximate set of 64-bit hashes in a fixed number of bits.
+
+    The k bit positions of a hash are derived from its two 32-bit halves
+    (Kirsch and Mitzenmacher).  With k = 7 the false positive rate is about
+    1% at 10 bits per element.
+
+    """
+
+    def __init__(self, bits, k=7):
+        import numpy
+
+        self.words = numpy.zeros(max(bits // 64, 1), dtype=numpy.uint64)
+        self.k = k
+
+    def add(self, hashes):
+        """Add the distinct hashes, return which were (probably) not in the set."""
+        import numpy
+
+        size = numpy.uint64(64 * len(self.words))
+        low = hashes & numpy.uint64(0xFFFFFFFF)
+        high = (hashes >> numpy.uint64(32)) | numpy.uint64(1)
+        steps = numpy.arange(self.k, dtype=numpy.uint64)
+        positions = (low[:, None] + steps * high[:, None]) % size
+        words = positions >> numpy.uint64(6)
+        bits = numpy.uint64(1) << (positions & numpy.uint64(63))
+        new = ~((self.words[words] & bits) != 0).all(axis=1)
+        numpy.bitwise_or.at(self.words, words[new].ravel(), bits[new].ravel())
+        return new
 
 
 @register
@@ -291,14 +831,20 @@ def diff(*cols, periods=1, axis=0):
 
     """
 
-    df = pipein()
-    if not cols:
-        df = df.diff(periods=periods, axis=axis)
-    else:
+    def diff_(df):
+        if not cols:
+            return df.diff(periods=periods, axis=axis)
         _assert_cols(df, cols, "diff")
         columns = list(cols)
         df[columns] = df[columns].diff(periods=periods, axis=axis)
-    pipeout(df)
+        return df
+
+    if not isinstance(periods, int):
+        sys.exit("--periods must be an int, not {}".format(periods))
+    if axis in (1, "columns"):
+        _stream(diff_)
+    else:
+        _stream_context(diff_, before=max(periods, 0), after=max(-periods, 0))
 
 
 @register
@@ -344,25 +890,502 @@ def dropna(axis=0, how="any", thresh=None):
     pipeout(df)
 
 
+# Exit status of a process killed by SIGPIPE, as reported by the shell
+_SIGPIPE_STATUS = 128 + 13
+
+
+def _broken_pipe():
+    """Stop the command, the reader of standard out has gone away.
+
+    Standard in is not read any further, so the command upstream gets a
+    broken pipe in turn and the whole pipeline winds down, as with `head`.
+
+    """
+    try:
+        # nothing more can be written, not even what is left in the buffer
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        os.close(devnull)
+    except (AttributeError, ValueError, OSError):
+        pass
+    sys.exit(_SIGPIPE_STATUS)
+
+
+def _stdout_closed():
+    """Whether standard out is a pipe whose reader has gone away."""
+    import select
+
+    try:
+        poll = select.poll()
+        poll.register(sys.stdout.fileno(), 0)
+        return any(event & select.POLLERR for _, event in poll.poll(0))
+    except (AttributeError, ValueError, OSError):
+        return False
+
+
 def _safe_out(output):
     """Prints output to standard out, catching broken pipe."""
     try:
         print(output)
     except BrokenPipeError:
+        _broken_pipe()
+
+
+class _Stage(object):
+    """The in-memory stream between the stages of `ph pipe`.
+
+    When `capture` is set, pipeout stores its frame in `output` instead of
+    writing csv, and the next stage's pipein reads it from `input`.  Frames
+    that csv would change (e.g. non-string column names) are stored as csv
+    text.  `schema` holds the column types from a PH_SCHEMA line on standard
+    in until pipein uses them, and `lazy` the parsed columns and the schema
+    of input read with --lazy.
+
+    """
+
+    def __init__(self):
+        self.capture = False
+        self.input = None
+        self.output = None
+        self.schema = None
+        self.lazy = None
+
+    def has_frame(self):
+        return self.input is not None and not isinstance(self.input, str)
+
+    def take(self):
+        frame, self.input = self.input, None
+        if hasattr(frame, "read_pandas"):  # a PH_WIRE stream, see _read_wire
+            frame = frame.read_pandas()
+        return frame
+
+    def has_stream(self):
+        return hasattr(self.input, "read_pandas")
+
+
+_STAGE = _Stage()
+
+
+# Preamble of the binary (Arrow IPC stream) format between ph processes
+_WIRE_MAGIC = b"\x00ph-arrow\n"
+
+
+# Start of the line with the column types that precedes the csv header
+_SCHEMA_PREFIX = b"#ph:schema:"
+
+
+def _stdout_is_pipe():
+    import stat
+
+    try:
+        return stat.S_ISFIFO(os.fstat(sys.stdout.fileno()).st_mode)
+    except (AttributeError, ValueError, OSError):
+        return False
+
+
+def _wire_out():
+    """Whether pipeout should write the binary format, see PH_WIRE.
+
+    Setting PH_WIRE=arrow is the promise that a pipe on standard out is
+    read by ph, which knows the stream by _WIRE_MAGIC.
+
+    """
+    if os.environ.get("PH_WIRE", "").lower() != "arrow":
+        return False
+    if not _stdout_is_pipe():
+        return False  # terminals and files always get csv
+    try:
+        import pyarrow  # noqa
+    except ImportError:
+        return False
+    return True
+
+
+def _schema_out():
+    """Whether pipeout should write the column types first, see PH_SCHEMA.
+
+    As with PH_WIRE, setting PH_SCHEMA is the promise that a pipe on
+    standard out is read by ph, which knows the line by _SCHEMA_PREFIX.
+
+    """
+    if os.environ.get("PH_SCHEMA", "False") not in TRUTHY:
+        return False
+    return _stdout_is_pipe()  # terminals and files always get plain csv
+
+
+def _write_schema(df, exact=True):
+    """Write the PH_SCHEMA line with the column types of df.
+
+    If df is only the first chunk of the output (exact is False), only the
+    types that any later chunk can be read as are given: text, categories
+    and dates.  Numbers are left to type inference, as a later chunk may
+    have missing values or text in an int column.
+
+    """
+    import json
+
+    parsed, types = _STAGE.lazy or (None, {})
+    schema = {}
+    for col, dtype in df.dtypes.items():
+        if parsed is not None and col not in parsed and dtype == object:
+            if col in types:  # text kept by --lazy has the type it came with
+                schema[col] = types[col]
+        elif dtype == object:
+            # columns of numbers in objects, e.g. from transpose, are not text
+            if pd.api.types.infer_dtype(df[col]) in ("string", "empty"):
+                schema[col] = str(dtype)
+        elif dtype.kind in "OM" or str(dtype) == "category":
+            schema[col] = str(dtype)
+        elif exact and dtype.kind in "iufb" and str(dtype) != "float16":
+            schema[col] = str(dtype)
+    line = json.dumps(schema, separators=(",", ":"))
+    try:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(_SCHEMA_PREFIX + line.encode("utf-8") + b"\n")
+    except BrokenPipeError:
+        _broken_pipe()
+
+
+def _read_schema(buffer):
+    """Read the PH_SCHEMA line at the start of buffer, if any."""
+    import json
+
+    try:
+        if buffer.peek(len(_SCHEMA_PREFIX))[: len(_SCHEMA_PREFIX)] != _SCHEMA_PREFIX:
+            return
+    except (OSError, ValueError):
+        return
+    line = buffer.readline()[len(_SCHEMA_PREFIX) :]
+    try:
+        schema = json.loads(line.decode("utf-8"))
+    except ValueError:
+        sys.exit("ph: cannot read the PH_SCHEMA line {}".format(line))
+    _STAGE.schema = schema if isinstance(schema, dict) else None
+
+
+def _schema_kwargs(schema=None):
+    """Take the PH_SCHEMA column types as the dtype and parse_dates of read_csv.
+
+    Types this pandas does not know are left to type inference.
+
+    """
+    if schema is None:
+        schema, _STAGE.schema = _STAGE.schema, None
+    if not schema:
+        return {}
+    dtype, dates = {}, []
+    for col, name in schema.items():
+        if str(name).startswith("datetime64"):
+            dates.append(col)
+            continue
         try:
-            sys.stdout.close()
-        except IOError:
-            pass
-        try:
-            sys.stderr.close()
-        except IOError:
+            dtype[col] = pd.api.types.pandas_dtype(name)
+        except TypeError:
             pass
+    kwargs = {"dtype": dtype} if dtype else {}
+    if dates:
+        kwargs["parse_dates"] = dates
+    return kwargs
+
+
+def _write_wire(df, chunks=()):
+    """Write df (and chunks) in the binary format.
+
+    Returns False if Arrow cannot hold df.
+
+    """
+    import pyarrow
+
+    chunksize = _chunksize() or None
+    try:
+        table = pyarrow.Table.from_pandas(df, preserve_index=False)
+    except (pyarrow.ArrowException, TypeError, ValueError):
+        return False
+    try:
+        sys.stdout.flush()
+        out = sys.stdout.buffer
+        out.write(_WIRE_MAGIC)
+        with pyarrow.ipc.new_stream(out, table.schema) as writer:
+            writer.write_table(table, max_chunksize=chunksize)
+            for chunk in chunks:
+                try:
+                    table = pyarrow.Table.from_pandas(
+                        chunk, schema=table.schema, preserve_index=False
+                    )
+                except (pyarrow.ArrowException, TypeError, ValueError) as err:
+                    sys.exit("ph: column types changed between chunks: {}".format(err))
+                writer.write_table(table, max_chunksize=chunksize)
+        out.flush()
+    except BrokenPipeError:
+        _broken_pipe()
+    return True
+
+
+def _read_wire():
+    """If standard in is in the binary format, make it the stage input.
+
+    The input is the open stream, which _wire_chunks reads record batch by
+    record batch, and _STAGE.take() all at once.
+
+    """
+    buffer = getattr(sys.stdin, "buffer", None)
+    if _STAGE.input is not None or not hasattr(buffer, "peek"):
+        return
+    try:
+        if buffer.peek(1)[:1] != _WIRE_MAGIC[:1]:
+            _read_schema(buffer)
+            return
+    except (OSError, ValueError):
+        return
+    if buffer.read(len(_WIRE_MAGIC)) != _WIRE_MAGIC:
+        sys.exit("ph: standard in is neither csv nor ph's binary format")
+    try:
+        import pyarrow
+    except ImportError:
+        sys.exit(
+            "ph: reading PH_WIRE=arrow input needs pyarrow, pip install ph[parquet]"
+        )
+    _STAGE.input = pyarrow.ipc.open_stream(buffer)
+
+
+def _wire_chunks(chunksize, replay=None):
+    """The PH_WIRE stream on standard in as DataFrames of chunksize rows.
+
+    With a _Replay, all of the stream can be read again with replay.frame().
+
+    """
+    reader, _STAGE.input = _STAGE.input, None
+    batches = reader if replay is None else replay.start_wire(reader)
+    return _arrow_chunks(batches, reader.schema, chunksize, _wire_frame)
+
+
+def _wire_frame(table):
+    """The DataFrame of a Table of the PH_WIRE stream."""
+    return table.to_pandas()
+
+
+def _stdin():
+    """Standard in of the current command as a text stream."""
+    _read_wire()
+    frame = _STAGE.take()
+    if frame is None:
+        return sys.stdin
+    import io
+
+    if not isinstance(frame, str):
+        frame = frame.to_csv(index=False)
+    return io.StringIO(frame)
+
+
+def _plain_columns(df):
+    """Whether the column names of df are kept as they are by csv."""
+    columns = df.columns
+    if isinstance(columns, pd.MultiIndex) or not columns.is_unique:
+        return False
+    return all(isinstance(col, str) for col in columns)
 
 
 def pipeout(df, sep=",", index=False, *args, **kwargs):
-    csv = df.to_csv(sep=sep, index=index, *args, **kwargs)
-    output = csv.rstrip("\n")
-    _safe_out(output)
+    if _STAGE.capture:
+        if sep == "," and not index and not args and not kwargs and _plain_columns(df):
+            _STAGE.output = df.reset_index(drop=True)
+        else:
+            _STAGE.output = _to_csv(df, sep=sep, index=index, *args, **kwargs)
+        return
+    if sep == "," and not index and not args and not kwargs and _wire_out():
+        if _plain_columns(df) and _write_wire(df):
+            return
+    if sep == "," and not index and not args and not kwargs and _schema_out():
+        if _plain_columns(df):
+            _write_schema(df)
+    _write_csv([df], sep=sep, index=index, *args, **kwargs)
+
+
+def _write_csv(frames, *args, **kwargs):
+    """Write DataFrames to standard out as one csv, --chunksize rows at a time.
+
+    Only the first frame gets a header.  Each slice is encoded and written
+    straight to the binary buffer of standard out, so the csv text of the
+    whole frame is never in memory.  Like print(csv.rstrip("\\n")), the
+    output ends in exactly one newline.
+
+    """
+    chunksize = _chunksize()
+    sys.stdout.flush()
+    out = getattr(sys.stdout, "buffer", None)
+    encoding = getattr(sys.stdout, "encoding", None) or "utf-8"
+    errors = getattr(sys.stdout, "errors", None) or "strict"
+    newlines = 0  # held back until we know they are not trailing
+    try:
+        for num, frame in enumerate(frames):
+            if num:
+                if not len(frame):
+                    continue
+                kwargs["header"] = False
+            rows = len(frame)
+            step = chunksize or rows or 1
+            for start in range(0, rows or 1, step):
+                text = _to_csv(frame.iloc[start : start + step], *args, **kwargs)
+                kwargs["header"] = False
+                stripped = text.rstrip("\n")
+                if stripped:
+                    stripped = "\n" * newlines + stripped
+                    newlines = 0
+                    if out is None:
+                        sys.stdout.write(stripped)
+                    else:
+                        out.write(stripped.encode(encoding, errors))
+                newlines += len(text) - len(text.rstrip("\n"))
+        if out is None:
+            sys.stdout.write("\n")
+        else:
+            out.write(b"\n")
+        sys.stdout.flush()
+    except BrokenPipeError:
+        _broken_pipe()
+
+
+def _to_csv(df, path_or_buf=None, **kwargs):
+    """df.to_csv with the --float-format policy, quicker for numbers.
+
+    Columns of ints, floats and bools are formatted a column at a time, in
+    one call to numpy (or one % for a --float-format) instead of one per
+    value, which gives the same bytes as to_csv in a fraction of the time.
+
+    """
+    import io
+
+    float_format = _float_format()
+    if float_format is not None and "float_format" not in kwargs:
+        kwargs["float_format"] = float_format
+    text = _numbers_csv(df, **kwargs)
+    if text is None:
+        fmt = kwargs.pop("float_format", None)
+        return _format_floats(df, fmt).to_csv(path_or_buf, **kwargs)
+    if path_or_buf is None:
+        return text
+    if isinstance(path_or_buf, io.IOBase):
+        path_or_buf.write(text)
+        return None
+    with open(path_or_buf, "w", newline="", encoding="utf-8") as fout:
+        fout.write(text)
+    return None
+
+
+def _format_floats(df, float_format):
+    """df with its float columns formatted as text with float_format."""
+    import numpy
+
+    if float_format is None:
+        return df
+    floats = [
+        idx
+        for idx, dtype in enumerate(df.dtypes)
+        if isinstance(dtype, numpy.dtype) and dtype.kind == "f"
+    ]
+    if not floats:
+        return df
+    texts = {}
+    for idx in floats:
+        values = df.iloc[:, idx].to_numpy()
+        text = numpy.array(_format_values(values, float_format), dtype=object)
+        text[numpy.isnan(values)] = numpy.nan
+        texts[idx] = pd.Series(text, index=df.index)
+    return _set_columns(df, texts)
+
+
+def _set_columns(df, columns):
+    """df with the columns at the positions in the dict columns replaced.
+
+    Columns are set by position, as names may be duplicated, and the frame
+    is rebuilt, as DataFrame.isetitem needs pandas 1.5.
+
+    """
+    if not columns:
+        return df
+    retval = pd.concat(
+        [columns.get(idx, df.iloc[:, idx]) for idx in range(len(df.columns))], axis=1
+    )
+    retval.columns = df.columns
+    return retval
+
+
+def _format_values(values, float_format):
+    """The float array values as a list of text, like to_csv would."""
+    if float_format is None:
+        return values.astype(str).tolist()
+    if "\n" in float_format:
+        return [float_format % value for value in values.tolist()]
+    return ((float_format + "\n") * len(values) % tuple(values.tolist())).split("\n")[
+        :-1
+    ]
+
+
+def _numbers_csv(df, sep=",", index=False, header=True, float_format=None, **kwargs):
+    """df.to_csv for DataFrames of only ints, floats and bools, or None."""
+    import numpy
+
+    if kwargs or index or header not in (True, False):
+        return None
+    if sep not in (",", "\t", ";", "|") or isinstance(df.columns, pd.MultiIndex):
+        return None
+    dtypes = list(df.dtypes)
+    if not dtypes or not all(
+        isinstance(dtype, numpy.dtype) and dtype.kind in "iubf" for dtype in dtypes
+    ):
+        return None
+    if float_format is not None and any(
+        c in float_format for c in (sep, '"', "\r", "\n")
+    ):
+        return None  # to be quoted
+    empty = '""' if len(dtypes) == 1 else ""  # an empty row is quoted
+    lines = []
+    if header:
+        lines.append(pd.DataFrame(columns=df.columns).to_csv(sep=sep, index=False))
+    step = 1 << 16  # rows formatted at a time, to bound the number of strs
+    for start in range(0, len(df), step):
+        columns = []
+        for idx, dtype in enumerate(dtypes):
+            values = df.iloc[start : start + step, idx].to_numpy()
+            if dtype.kind != "f":
+                columns.append(values.astype(str).tolist())
+                continue
+            text = _format_values(values, float_format)
+            for row in numpy.flatnonzero(numpy.isnan(values)).tolist():
+                text[row] = empty
+            columns.append(text)
+        lines.append("".join([sep.join(row) + "\n" for row in zip(*columns)]))
+    return "".join(lines)
+
+
+def _read_header():
+    """Read the column names from the first line of standard in.
+
+    Mimics the column naming of pandas.read_csv without importing pandas.
+
+    """
+    import csv
+
+    _read_wire()
+    if _STAGE.has_frame():
+        return [str(col) for col in _STAGE.take().columns]
+    for header in csv.reader(_stdin()):
+        if header:
+            break
+    else:
+        return []
+    if header[0].startswith("\ufeff"):
+        header[0] = header[0][1:]
+    names = []
+    for idx, name in enumerate(header):
+        if not name:
+            name = "Unnamed: {}".format(idx)
+        base, dup = name, 0
+        while name in names:
+            dup += 1
+            name = "{}.{}".format(base, dup)
+        names.append(name)
+    return names
 
 
 def pipein(ftype="csv", **kwargs):
@@ -379,12 +1402,692 @@ def pipein(ftype="csv", **kwargs):
     if kwargs.get("sep") == "\\t":
         kwargs["sep"] = "\t"
 
-    try:
-        return READERS[ftype](sys.stdin, **kwargs)
-    except pd.errors.EmptyDataError:
-        return pd.DataFrame()
-    except pd.errors.ParserError as err:
-        sys.exit(str(err))
+    if ftype == "csv":
+        _read_wire()
+    if ftype == "csv" and not kwargs and _STAGE.has_frame():
+        return _STAGE.take()
+    if ftype == "csv" and not kwargs and _STAGE.schema:
+        kwargs = _schema_kwargs()
+    if ftype == "csv" and not kwargs and _STAGE.input is None and _jobs() > 1:
+        fd = _stdin_fd()
+        df = None if fd is None else _read_csv_jobs(fd)
+        if df is not None:
+            return df
+
+    try:
+        return READERS[ftype](_stdin(), **kwargs)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+    except pd.errors.ParserError as err:
+        sys.exit(str(err))
+
+
+def _pipein_chunks(replay=None, **kwargs):
+    """Read standard in as DataFrames of at most --chunksize rows.
+
+    Yields at least one, possibly empty, DataFrame.  Input that is already
+    in memory (ph pipe) is yielded as one chunk, a PH_WIRE stream in chunks
+    of its record batches.  With a _Replay, all of the input can be read
+    again with replay.frame().
+
+    """
+    chunksize = _chunksize()
+    _read_wire()
+    if chunksize and not kwargs and _STAGE.has_stream():
+        for chunk in _wire_chunks(chunksize, replay):
+            if _stdout_closed():
+                _broken_pipe()
+            yield chunk
+        return
+    if not chunksize or _STAGE.input is not None:
+        yield pipein(**kwargs)
+        return
+    if not kwargs:
+        kwargs = _schema_kwargs()
+    stream = sys.stdin
+    if replay is not None:
+        stream = replay.start(stream, kwargs)
+    try:
+        reader = _read_csv(stream, chunksize=chunksize, **kwargs)
+    except pd.errors.EmptyDataError:
+        yield pd.DataFrame()
+        return
+    try:
+        for chunk in reader:
+            if _stdout_closed():
+                _broken_pipe()
+            yield chunk
+    except pd.errors.ParserError as err:
+        sys.exit(str(err))
+    except _TypesChanged:
+        if replay is not None:
+            raise
+        sys.exit(_ARROW_TYPES_CHANGED)
+
+
+# A _TypesChanged of _read_arrow_chunks where all input cannot be read again
+_ARROW_TYPES_CHANGED = (
+    "ph: the column types change further down in the input, which "
+    "--engine=pyarrow cannot read in chunks; use --chunksize=0"
+)
+
+
+def _typed_chunks(scan=None, **kwargs):
+    """Read standard in as chunks with the column types of all input.
+
+    A chunk of _pipein_chunks has the types of its own rows: an int column
+    with a missing value in some chunk is float in that chunk only, and
+    written as 6.0 instead of 6.  So standard in is first read to settle
+    the types, see _settle_types, and then again in chunks of those types.
+    A column that changes in other ways, from numbers to text, say, gives
+    all of the input as one chunk.  scan, if given, is called with each
+    chunk as it is first read; it has not seen all input if only one chunk
+    is yielded.
+
+    """
+    replay = _Replay()
+    chunks = _pipein_chunks(replay, **kwargs)
+    first = next(chunks)
+    types, count = _settle_types({}, first), 1
+    if scan is not None:
+        scan(first)
+    try:
+        for chunk in chunks:
+            types = _settle_types(types, chunk)
+            count += 1
+            if scan is not None:
+                scan(chunk)
+    except _TypesChanged:
+        yield replay.frame()
+        return
+    if count == 1:
+        yield first
+        return
+    del first
+    widened = {
+        col: dtype
+        for col, dtype in types.items()
+        if dtype is not None and dtype.kind in "fO"
+    }
+    yield from replay.chunks(widened)
+
+
+def _settle_types(types, chunk):
+    """The column types of the chunks of types and of chunk, column -> dtype.
+
+    int and float give float, as when reading both at once.  A column
+    without values (None) takes the type of the others, and makes int
+    float; bool, which cannot hold missing values, is a change as well.
+    Raises _TypesChanged on other changes.
+
+    """
+    if types and list(types) != list(chunk.columns):
+        raise _TypesChanged()
+    settled = {}
+    for col, dtype in chunk.dtypes.items():
+        if dtype.kind == "f" and chunk[col].isna().all():
+            dtype = None
+        was = types.get(col, dtype)
+        if was is None or dtype is None:
+            known = dtype if was is None else was
+            if known is not None and known.kind == "b":
+                raise _TypesChanged()
+            settled[col] = known
+            if known is not None and known.kind in "iu":
+                settled[col] = pd.api.types.pandas_dtype(float)
+        elif was == dtype:
+            settled[col] = was
+        elif {was.kind, dtype.kind} <= set("iuf"):
+            settled[col] = pd.api.types.pandas_dtype(float)
+        else:
+            raise _TypesChanged()
+    return settled
+
+
+class _TypesChanged(Exception):
+    """A chunk has other column types than the first, see _assert_same_types."""
+
+
+class _Replay(object):
+    """Standard in for read_csv, which can be read again from the start.
+
+    Commands that work chunk by chunk fall back to reading all input at once
+    when the column types change between chunks.  A regular file is then
+    read again from where it started, other input is copied to a temporary
+    file as it is read; the record batches of a PH_WIRE stream are copied
+    as a stream of their own.
+
+    """
+
+    def __init__(self):
+        self.stream = None
+        self.kwargs = {}
+        self.offset = None
+        self.spool = None
+        self.wire = None
+
+    def start(self, stream, kwargs):
+        import stat
+        import tempfile
+
+        self.stream, self.kwargs = stream, kwargs
+        try:
+            if stat.S_ISREG(os.fstat(stream.fileno()).st_mode):
+                self.offset = stream.buffer.tell()
+        except (AttributeError, ValueError, OSError):
+            self.offset = None
+        if self.offset is None:
+            self.spool = tempfile.SpooledTemporaryFile(
+                1 << 24, mode="w+", encoding="utf-8", errors="surrogateescape"
+            )
+        return self
+
+    def start_wire(self, reader):
+        """The record batches of the PH_WIRE stream reader, copied as read."""
+        import pyarrow
+        import tempfile
+
+        self.stream = reader
+        self.spool = tempfile.SpooledTemporaryFile(1 << 24)
+        self.wire = pyarrow.ipc.new_stream(self.spool, reader.schema)
+        return self._wire_batches()
+
+    def _wire_batches(self):
+        for batch in self.stream:
+            self.wire.write_batch(batch)
+            yield batch
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        if self.spool is not None:
+            self.spool.write(data)
+        return data
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.stream.readline()
+        if not line:
+            raise StopIteration
+        if self.spool is not None:
+            self.spool.write(line)
+        return line
+
+    def rewind(self):
+        """The input from the start, as a stream for read_csv."""
+        import io
+        import shutil
+
+        if hasattr(self.stream, "read_pandas"):
+            import pyarrow
+
+            if self.wire is not None:
+                for batch in self.stream:
+                    self.wire.write_batch(batch)
+                self.wire.close()
+                self.wire = None
+            self.spool.seek(0)
+            return pyarrow.ipc.open_stream(self.spool)
+        if self.spool is None:
+            raw = io.open(os.dup(self.stream.fileno()), "rb")
+            raw.seek(self.offset)
+            return io.TextIOWrapper(
+                raw, encoding=self.stream.encoding, errors=self.stream.errors
+            )
+        shutil.copyfileobj(self.stream, self.spool)
+        self.spool.seek(0)
+        return self.spool
+
+    def frame(self):
+        """All of the input, read at once."""
+        if hasattr(self.stream, "read_pandas"):
+            return self.rewind().read_pandas()
+        try:
+            return _read_csv(self.rewind(), **self.kwargs)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+        except pd.errors.ParserError as err:
+            sys.exit(str(err))
+
+    def chunks(self, dtype):
+        """All of the input again, in chunks, with some column types fixed."""
+        if hasattr(self.stream, "read_pandas"):
+            reader = self.rewind()
+            for chunk in _arrow_chunks(
+                reader, reader.schema, _chunksize(), _wire_frame
+            ):
+                if _stdout_closed():
+                    _broken_pipe()
+                yield chunk.astype(dtype)
+            return
+        kwargs = dict(self.kwargs)
+        kwargs["dtype"] = dict(kwargs.get("dtype") or {})
+        kwargs["dtype"].update(dtype)
+        try:
+            for chunk in _read_csv(self.rewind(), chunksize=_chunksize(), **kwargs):
+                if _stdout_closed():
+                    _broken_pipe()
+                yield chunk
+        except pd.errors.ParserError as err:
+            sys.exit(str(err))
+
+
+def _concat_chunks(chunks, replay):
+    """The chunks as one DataFrame, as if all input was read at once."""
+    try:
+        chunks, types = list(chunks), {}
+        for chunk in chunks:
+            types = _settle_types(types, chunk)
+    except _TypesChanged:
+        return replay.frame()
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _hold(chunks):
+    """Run chunks to the end before anything is written.
+
+    The DataFrames are kept in a temporary file, so a _TypesChanged is
+    raised before any output and the output can still be streamed.
+
+    """
+    import pickle
+    import tempfile
+
+    spool = tempfile.SpooledTemporaryFile(1 << 24)
+    count = 0
+    for chunk in chunks:
+        pickle.dump(chunk, spool, pickle.HIGHEST_PROTOCOL)
+        count += 1
+    spool.seek(0)
+
+    def frames():
+        with spool:
+            for _ in range(count):
+                yield pickle.load(spool)
+
+    return frames()
+
+
+def _expr_names(expr):
+    """The names in a DataFrame.eval or query expression, such as columns."""
+    quoted = re.findall(r"`([^`]*)`", expr)
+    return quoted + re.findall(r"[^\W\d]\w*", re.sub(r"`[^`]*`", " ", expr))
+
+
+def _pipein_rows(nrows):
+    """Read the first nrows rows of standard in and leave the rest unread.
+
+    The process exits without consuming the remainder of the stream, so the
+    upstream producer is stopped by SIGPIPE instead of being drained.
+
+    """
+    _read_wire()
+    if _STAGE.has_stream():
+        return next(_wire_chunks(max(nrows, 1))).head(nrows)
+    if _STAGE.input is not None:
+        return pipein().head(nrows)
+    try:
+        return _read_csv(sys.stdin, nrows=nrows, **_schema_kwargs())
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+    except pd.errors.ParserError as err:
+        sys.exit(str(err))
+
+
+def _count_records(blocksize=1 << 20):
+    """Count the csv records of standard in without parsing them.
+
+    The raw bytes are scanned a block at a time, so memory stays constant.  As
+    in pandas.read_csv, newlines within quotes do not end a record and blank
+    or whitespace-only lines are skipped.  Returns the first record, the
+    header, as bytes (None for empty input) and the number of records after
+    it.
+
+    """
+    import numpy
+
+    stream = _stdin()
+    read = getattr(stream, "buffer", stream).read
+    blank = numpy.zeros(256, dtype=bool)
+    blank[[ord(c) for c in " \t\r\n"]] = True
+    header, pending = None, b""
+    quoted, filled, records = False, False, 0
+    while True:
+        block = read(blocksize)
+        if not block:
+            break
+        if isinstance(block, str):
+            block = block.encode("utf-8")
+        data = numpy.frombuffer(block, dtype=numpy.uint8)
+        ends = numpy.flatnonzero(data == ord("\n"))
+        quotes = numpy.flatnonzero(data == ord('"'))
+        if len(quotes):
+            inside = (numpy.searchsorted(quotes, ends) + quoted) % 2
+            ends = ends[inside == 0]
+            quoted = (len(quotes) + quoted) % 2 == 1
+        elif quoted:
+            ends = ends[:0]
+        # Only lines ending in whitespace can be blank, check those in full.
+        last = numpy.maximum(ends - 1, 0)
+        last = numpy.maximum(last - (data[last] == ord("\r")), 0)
+        empty = set()
+        for idx in numpy.flatnonzero(blank[data[last]]):
+            start = ends[idx - 1] + 1 if idx else 0
+            if not block[start : ends[idx]].strip(b" \t\r") and (idx or not filled):
+                empty.add(idx)
+        if header is None and len(ends) > len(empty):
+            idx = next(idx for idx in range(len(ends)) if idx not in empty)
+            start = ends[idx - 1] + 1 if idx else 0
+            header = (b"" if idx else pending) + block[start : ends[idx] + 1]
+        elif header is None:
+            pending = block[ends[-1] + 1 :] if len(ends) else pending + block
+        records += len(ends) - len(empty)
+        rest = block[ends[-1] + 1 :] if len(ends) else block
+        filled = bool(rest.strip(b" \t\r\n")) or (filled and not len(ends))
+    if filled:
+        records += 1
+        if header is None:
+            header = pending
+    return header, max(records - 1, 0)
+
+
+def _pipeout_chunks(chunks):
+    """Write DataFrames to standard out as they come, as one csv.
+
+    Unlike pipeout(pd.concat(chunks)), the whole output never needs to be
+    in memory.
+
+    """
+    chunks = iter(chunks)
+    first = next(chunks)
+    if _STAGE.capture:
+        pipeout(pd.concat([first] + list(chunks)))
+        return
+    if _wire_out() and _plain_columns(first) and _write_wire(first, chunks):
+        return
+    if _schema_out() and _plain_columns(first):
+        _write_schema(first, exact=False)
+    import itertools
+
+    _write_csv(itertools.chain([first], chunks), index=False)
+
+
+def _stream(fn, lazy=None, **kwargs):
+    """Apply fn to standard in, chunk by chunk, and write the results.
+
+    The chunks have the column types of all input, see _typed_chunks, so
+    the output is that of fn on all input at once.  If fn uses only the
+    columns in lazy, --lazy parses just those, see _stream_lazy.
+
+    """
+    if lazy is not None and not kwargs and _lazy() and _stream_lazy(fn, lazy):
+        return
+    _pipeout_chunks(fn(df) for df in _typed_chunks(**kwargs))
+
+
+def _raw_records(chunksize, blocksize=1 << 24):
+    """Read standard in as bytes, the header and then blocks of records.
+
+    Blocks end with a newline that is not within quotes, and hold the
+    records read with the last blocksize bytes, at most chunksize of them
+    (all records for 0).  Blank lines before the header are skipped, and
+    nothing is yielded for empty input.
+
+    """
+    import numpy
+
+    stream = _stdin()
+    read = getattr(stream, "buffer", stream).read
+    pending = bytearray()
+    ends = []  # the newlines in pending that end a record
+    quotes = 0
+    header = None
+    eof = False
+    while not eof:
+        data = read(blocksize)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not data:
+            eof = True
+            if pending and not pending.endswith(b"\n"):
+                data = b"\n"
+        if data:
+            buf = numpy.frombuffer(data, dtype=numpy.uint8)
+            newlines = numpy.flatnonzero(buf == ord("\n"))
+            quoted = numpy.flatnonzero(buf == ord('"'))
+            even = (numpy.searchsorted(quoted, newlines) + quotes) % 2 == 0
+            ends.extend((newlines[even] + len(pending)).tolist())
+            quotes += len(quoted)
+            pending.extend(data)
+
+        cut, done = 0, 0
+        while done < len(ends):
+            if header is None:
+                record = bytes(pending[cut : ends[done] + 1])
+                cut, done = ends[done] + 1, done + 1
+                if record.strip():
+                    header = record
+                    yield header
+                continue
+            if chunksize:
+                stop = min(done + chunksize, len(ends))
+            elif eof:
+                stop = len(ends)
+            else:
+                break
+            yield bytes(pending[cut : ends[stop - 1] + 1])
+            cut, done = ends[stop - 1] + 1, stop
+        if eof and pending[cut:].strip():
+            yield bytes(pending[cut:])  # an open quote, which read_csv reports
+            cut = len(pending)
+        del pending[:cut]
+        ends = [end - cut for end in ends[done:]]
+
+
+def _stream_lazy(fn, cols):
+    """Apply fn, which only uses the columns cols, to raw blocks of standard in.
+
+    In a block without quotes and carriage returns, in which every record
+    has all the fields, only the fields of cols are parsed.  fn gets a
+    DataFrame of these columns, and may change them, add columns at the end
+    and drop rows.  The other fields of the records that are left are
+    written as the bytes they were read as.  Other blocks, and results of
+    fn that do something else, are parsed and written as usual.
+
+    Returns False, without reading anything, if the input is a DataFrame
+    already or the output is not csv.
+
+    """
+    import itertools
+
+    _read_wire()
+    if _STAGE.capture or _STAGE.input is not None or _wire_out():
+        return False
+    schema, _STAGE.schema = _STAGE.schema or {}, None
+    records = _raw_records(_chunksize())
+    header = next(records, None)
+    if header is None:
+        _pipeout_chunks([fn(pd.DataFrame())])
+        return True
+    names = [str(name) for name in _lazy_parse(header, {}).columns]
+    touched = [name for name in names if name in cols]
+    columns = None  # of the output, from the first block
+    sys.stdout.flush()
+    out = getattr(sys.stdout, "buffer", None)
+    try:
+        for block in itertools.chain(records, [None]):
+            if block is None and columns is not None:
+                break
+            if _stdout_closed():
+                _broken_pipe()
+            result = None
+            if block is not None and len(names) > 1:
+                result = _lazy_block(fn, block, names, touched, columns, schema)
+            if result is None:
+                df = _lazy_parse(header + (block or b""), schema)
+                frame = fn(df)
+                text = _to_csv(frame, index=False, header=False).encode("utf-8")
+                new = list(frame.columns)
+                _STAGE.lazy = None
+            else:
+                text, frame, new = result
+                _STAGE.lazy = set(frame.columns), schema
+            if columns is None and result is not None:
+                others = [col for col in names if col not in touched]
+                others = pd.DataFrame(index=frame.index, columns=others, dtype=object)
+                frame = pd.concat([frame, others], axis=1)
+            if columns is None:
+                columns = new
+                if _schema_out() and _plain_columns(frame):
+                    _write_schema(frame[columns], exact=False)
+                text = (
+                    pd.DataFrame(columns=columns).to_csv(index=False).encode("utf-8")
+                    + text
+                )
+            if out is None:
+                sys.stdout.write(text.decode("utf-8"))
+            else:
+                out.write(text)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        _broken_pipe()
+    return True
+
+
+def _lazy_parse(data, schema):
+    """Parse the bytes data, a header and records, like pipein would."""
+    import io
+
+    try:
+        return _read_csv(io.BytesIO(data), **_schema_kwargs(dict(schema)))
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+    except pd.errors.ParserError as err:
+        sys.exit(str(err))
+
+
+def _lazy_block(fn, block, names, touched, columns, schema):
+    """Apply fn to the fields of touched in block, see _stream_lazy.
+
+    Returns the csv records, the DataFrame of fn and the columns of the
+    output, or None if block or fn do not lend themselves to it.
+
+    """
+    import io
+    import numpy
+
+    buf = numpy.frombuffer(block, dtype=numpy.uint8)
+    if (buf == ord('"')).any() or (buf == ord("\r")).any():
+        return None
+    ends = numpy.flatnonzero(buf == ord("\n"))
+    seps = numpy.flatnonzero(buf == ord(","))
+    if not len(ends) or len(seps) != len(ends) * (len(names) - 1):
+        return None
+    seps = seps.reshape(len(ends), len(names) - 1)
+    if (seps[:, -1] > ends).any() or (seps[1:, 0] < ends[:-1]).any():
+        return None  # a record with too few fields and one with too many
+    starts = numpy.concatenate([[0], ends[:-1] + 1])
+
+    fields, lows, highs = [], [], []
+    for col in touched:
+        pos = names.index(col)
+        lows.append((seps[:, pos - 1] + 1 if pos else starts).tolist())
+        highs.append((seps[:, pos] if pos < len(names) - 1 else ends).tolist())
+        fields.append([block[a:b] for a, b in zip(lows[-1], highs[-1])])
+    if touched:
+        text = b"\n".join(b",".join(row) for row in zip(*fields)) + b"\n"
+        df = pd.read_csv(
+            io.BytesIO(text),
+            header=None,
+            names=touched,
+            skip_blank_lines=False,
+            **_schema_kwargs({col: schema[col] for col in touched if col in schema}),
+        )
+    else:
+        df = pd.DataFrame(index=pd.RangeIndex(len(ends)))
+
+    result = fn(df)
+    if not isinstance(result, pd.DataFrame):
+        return None
+    new = list(result.columns[len(touched) :])
+    if list(result.columns[: len(touched)]) != touched:
+        return None
+    if any(not isinstance(col, str) or col in names for col in new):
+        return None
+    if len(set(new)) != len(new) or columns not in (None, names + new):
+        return None
+    rows = result.index
+    if not (
+        rows.is_unique and rows.is_monotonic_increasing and rows.dtype.kind in "iu"
+    ):
+        return None
+    if len(rows) and (rows[0] < 0 or rows[-1] >= len(ends)):
+        return None
+
+    texts = []
+    for col in result.columns:
+        lines = _to_csv(result[[col]], index=False, header=False).encode("utf-8")
+        lines = lines.split(b"\n")[:-1]
+        if len(lines) != len(result):
+            return None  # a value with a newline
+        texts.append([b"" if line == b'""' else line for line in lines])
+
+    starts, ends = starts.tolist(), ends.tolist()
+    pieces = []
+    for i, row in enumerate(rows.tolist()):
+        pos = starts[row]
+        for low, high, text in zip(lows, highs, texts):
+            pieces += [block[pos : low[row]], text[i]]
+            pos = high[row]
+        pieces.append(block[pos : ends[row]])
+        for text in texts[len(touched) :]:
+            pieces += [b",", text[i]]
+        pieces.append(b"\n")
+    return b"".join(pieces), result, names + new
+
+
+def _stream_context(fn, before=0, after=0, carry_output=False, chunks=None):
+    """Apply fn to standard in, chunk by chunk, with rows of context.
+
+    The result of fn for a row may depend on the `before` rows before it
+    and the `after` rows after it, which are taken from the neighbouring
+    chunks, so that the result is the same as that of fn on all input.
+    With carry_output the rows before are taken from the result of fn
+    instead of its input.  after may also be a function of the result of
+    fn for a chunk, giving the number of last rows that are not final.
+    The chunks default to those of standard in, with the column types of all
+    input, see _typed_chunks.
+
+    """
+
+    import itertools
+
+    if chunks is None:
+        chunks = _typed_chunks()
+
+    def results():
+        context = rows = None
+        for df in itertools.chain(chunks, [None]):
+            if df is not None:
+                rows = df if rows is None else pd.concat([rows, df], ignore_index=True)
+            # fn may modify its argument, rows are still needed
+            data = rows.copy()
+            if context is not None:
+                data = pd.concat([context, rows], ignore_index=True)
+            result = fn(data).iloc[len(data) - len(rows) :]
+            done = len(rows)
+            if df is not None:
+                done -= min(after(result) if callable(after) else after, len(rows))
+            if before:
+                done_rows = (result if carry_output else rows).iloc[:done]
+                if context is not None:
+                    done_rows = pd.concat([context, done_rows], ignore_index=True)
+                context = done_rows.tail(before)
+            rows = rows.iloc[done:]
+            yield result.iloc[:done]
+
+    _pipeout_chunks(results())
 
 
 @register
@@ -419,10 +2122,35 @@ def fillna(value=None, method=None, limit=None):
     if method is not None:
         if method not in METHODS:
             sys.exit("method must be one of {}, not {}".format(METHODS, method))
-        pipeout(pipein().fillna(method=method, limit=limit))
+
+        def fillna_(df):
+            return df.fillna(method=method, limit=limit)
+
+        if method in ("pad", "ffill"):
+            # a row is filled from the last value, or the last `limit` rows
+            _stream_context(fillna_, before=limit or 1, carry_output=limit is None)
+        elif limit is not None:
+            _stream_context(fillna_, after=limit)
+        else:
+            # rows after the last value of some column wait for the next chunk
+            _stream_context(fillna_, after=lambda df: df.isna().any(axis=1).sum())
     elif value is not None:
         value = __tryparse(value)
-        pipeout(pipein().fillna(value=value, limit=limit))
+        # with a limit, only the first `limit` N/A values of a column are filled
+        left = {}
+
+        def fillna_(df):
+            if limit is None:
+                return df.fillna(value=value)
+            for col in df.columns:
+                left.setdefault(col, limit)
+                if left[col] > 0:
+                    missing = df[col].isna().sum()
+                    df[col] = df[col].fillna(value=value, limit=left[col])
+                    left[col] -= min(missing, left[col])
+            return df
+
+        _stream(fillna_)
     else:
         sys.exit("'ph fillna' needs exactly one of value and method")
 
@@ -434,9 +2162,7 @@ def query(expr):
     Usage: cat a.csv | ph query "x > 5"
 
     """
-    df = pipein()
-    new_df = df.query(expr)
-    pipeout(new_df)
+    _stream(lambda df: df.query(expr), lazy=_expr_names(expr))
 
 
 @register
@@ -458,8 +2184,6 @@ def grep(*expr, case=True, na=float("nan"), regex=True, column=None):
     double-escaped.)
 
     """
-    df = pipein()
-
     if case is True or case in TRUTHY:
         case = True
     elif case in FALSY:
@@ -474,9 +2198,6 @@ def grep(*expr, case=True, na=float("nan"), regex=True, column=None):
     else:
         sys.exit("ph grep:  Unknown --regex={} should be True or False".format(regex))
 
-    if column is not None:
-        _assert_col(df, column, "grep")
-
     expr = " ".join(str(e) for e in expr)  # force string input
 
     try:
@@ -484,15 +2205,21 @@ def grep(*expr, case=True, na=float("nan"), regex=True, column=None):
     except ImportError:
         sys.exit("numpy needed for grep.  pip install numpy")
 
-    retval = df[
-        numpy.logical_or.reduce(
-            [
-                df[col].astype(str).str.contains(expr, case=case, na=na, regex=regex)
-                for col in (df.columns if column is None else [column])
-            ]
-        )
-    ]
-    pipeout(retval)
+    def grep_(df):
+        if column is not None:
+            _assert_col(df, column, "grep")
+        return df[
+            numpy.logical_or.reduce(
+                [
+                    df[col]
+                    .astype(str)
+                    .str.contains(expr, case=case, na=na, regex=regex)
+                    for col in (df.columns if column is None else [column])
+                ]
+            )
+        ]
+
+    _stream(grep_)
 
 
 @register
@@ -501,11 +2228,14 @@ def appendstr(col, s, newcol=None):
 
     Usage: cat e.csv | ph appendstr year -01-01 | ph date year
     """
-    df = pipein()
     if newcol is None:
         newcol = col
-    df[newcol] = df[col].astype(str) + s
-    pipeout(df)
+
+    def appendstr_(df):
+        df[newcol] = df[col].astype(str) + s
+        return df
+
+    _stream(appendstr_, lazy=[col])
 
 
 @register
@@ -519,17 +2249,22 @@ def split(col, pat=" "):
 
     """
     pat = str(pat)
-    df = pipein()
-    _assert_col(df, col, "split")
-    new_name = col + "_rhs"
-    suffix = ""
-    name = lambda: (new_name + "_" + str(suffix)).rstrip("_")
-    while name() in df.columns:
-        if not suffix:
-            suffix = 1
-        suffix += 1
-    df[[col, name()]] = df[col].astype(str).str.split(pat=pat, n=1, expand=True)
-    pipeout(df)
+
+    def split_(df):
+        _assert_col(df, col, "split")
+        new_name = col + "_rhs"
+        suffix = ""
+        name = lambda: (new_name + "_" + str(suffix)).rstrip("_")
+        while name() in df.columns:
+            if not suffix:
+                suffix = 1
+            suffix += 1
+        parts = df[col].astype(str).str.split(pat=pat, n=1, expand=True)
+        # a chunk where no value contains pat is split into one column only
+        df[[col, name()]] = parts.reindex(columns=[0, 1])
+        return df
+
+    _stream(split_, lazy=[col])
 
 
 @register
@@ -541,20 +2276,21 @@ def strip(*cols, lstrip=False, rstrip=False):
            cat x.csv | ph strip --rstrip=True
 
     """
-    df = pipein()
-    if not cols:
-        cols = list(df.columns)
-    else:
-        cols = list(cols)
-    _assert_cols(df, cols, "strip")
-    for c in cols:
-        if lstrip in TRUTHY:
-            df[c] = df[c].str.lstrip()
-        elif rstrip in TRUTHY:
-            df[c] = df[c].str.rstrip()
-        else:
-            df[c] = df[c].str.strip()
-    pipeout(df)
+
+    def strip_(df):
+        _assert_cols(df, cols, "strip")
+        for c in cols or df.columns:
+            if df[c].dtype != object:
+                continue  # e.g. a column with only nan in this chunk
+            if lstrip in TRUTHY:
+                df[c] = df[c].str.lstrip()
+            elif rstrip in TRUTHY:
+                df[c] = df[c].str.rstrip()
+            else:
+                df[c] = df[c].str.strip()
+        return df
+
+    _stream(strip_, lazy=list(cols) or None)
 
 
 @register
@@ -568,12 +2304,15 @@ def removeprefix(col, prefix=" "):
     """
     prefix = str(prefix)
     plen = len(prefix)
-    df = pipein()
-    _assert_col(df, col, "removeprefix")
-    df[col] = df[col].apply(
-        lambda s: str(s)[plen:] if str(s).startswith(prefix) else str(s)
-    )
-    pipeout(df)
+
+    def removeprefix_(df):
+        _assert_col(df, col, "removeprefix")
+        df[col] = df[col].apply(
+            lambda s: str(s)[plen:] if str(s).startswith(prefix) else str(s)
+        )
+        return df
+
+    _stream(removeprefix_, lazy=[col])
 
 
 @register
@@ -587,12 +2326,15 @@ def removesuffix(col, suffix=" "):
     """
     suffix = str(suffix)
     plen = len(suffix)
-    df = pipein()
-    _assert_col(df, col, "removesuffix")
-    df[col] = df[col].apply(
-        lambda s: str(s)[:-plen] if str(s).endswith(suffix) else str(s)
-    )
-    pipeout(df)
+
+    def removesuffix_(df):
+        _assert_col(df, col, "removesuffix")
+        df[col] = df[col].apply(
+            lambda s: str(s)[:-plen] if str(s).endswith(suffix) else str(s)
+        )
+        return df
+
+    _stream(removesuffix_, lazy=[col])
 
 
 @register
@@ -602,35 +2344,47 @@ def astype(type, column=None, newcolumn=None):
     Usage:  cat a.csv | ph astype double x [new_x]
 
     """
-    df = pipein()
-    try:
-        if column is None:
-            df = df.astype(type)
-        elif newcolumn is not None:
-            df[newcolumn] = df[column].astype(type)
-        else:
-            df[column] = df[column].astype(type)
-    except ValueError as err:
-        sys.exit("Could not convert to {}: {}".format(type, err))
-    pipeout(df)
+
+    def astype_(df):
+        try:
+            if column is None:
+                df = df.astype(type)
+            elif newcolumn is not None:
+                df[newcolumn] = df[column].astype(type)
+            else:
+                df[column] = df[column].astype(type)
+        except ValueError as err:
+            sys.exit("Could not convert to {}: {}".format(type, err))
+        return df
+
+    _stream(astype_, lazy=None if column is None else [column])
 
 
 @register
-def dtypes(t=None):
+def dtypes(t=None, sample=None):
     """If no argument is provided, output types, otherwise filter on types.
 
     If no argument is provided, output a csv with two columns, "column" and
     "dtype".  The "column" column contains the names of the columns in the input
     csv and the "dtype" column contains their respective types.
 
+    With --sample=n, the types are inferred from the first n rows only, and
+    the rest of the input is not read.
+
     If an argument is provided, all columns with the prescribed type is output.
 
     Usage:  cat a.csv | ph dtypes
+            cat a.csv | ph dtypes --sample=1000
             cat a.csv | ph dtypes float64
 
     """
+    if sample is not None:
+        if t is not None:
+            sys.exit("--sample only applies when listing the types")
+        if not isinstance(sample, int) or isinstance(sample, bool) or sample < 1:
+            sys.exit("--sample must be a positive int, not {}".format(sample))
     if t is None:
-        df = pipein()
+        df = pipein() if sample is None else _pipein_rows(sample)
         newdf = pd.DataFrame(pd.Series(df.columns), columns=["column"])
         newdf["dtype"] = pd.Series([str(e) for e in df.dtypes])
         pipeout(newdf.T, header=False)
@@ -683,12 +2437,19 @@ def groupby(*columns, how="sum", as_index=False):
            cat a.csv | ph groupby animal --how=mean
            cat a.csv | ph groupby animal --how=prod
            cat a.csv | ph groupby animal --as_index=True  # removes index
+
+    count, min, max, first, last, sum, mean, var and std, and prod of
+    integers, are computed chunk by chunk (see --chunksize) when all other
+    columns are numbers.  The result is the same as when all input is read
+    at once: sums of floats, means, var and std are computed from exact
+    sums, see _ExactSums, so they may differ from those of pandas in the
+    last digits.
     """
+    import itertools
+
     columns = list(columns)
     if not columns:
         sys.exit("Needs at least one column to group by")
-    df = pipein()
-    _assert_cols(df, columns, "groupby")
     if as_index in TRUTHY:
         as_index = True
     elif as_index in FALSY:
@@ -696,7 +2457,31 @@ def groupby(*columns, how="sum", as_index=False):
     else:
         sys.exit("--as_index=True or False, not {}".format(as_index))
 
-    grouped = df.groupby(columns, as_index=as_index)
+    if how in _GROUPBY_MERGE:
+        replay = _Replay()
+        chunks = _pipein_chunks(replay)
+        df = next(chunks)
+        _assert_cols(df, columns, "groupby")
+        retval = None
+        if _exact_merge(df, columns, how):
+            try:
+                retval = _groupby_chunks([df], chunks, columns, how)
+            except _TypesChanged:
+                df = replay.frame()
+                if _exact_merge(df, columns, how):
+                    retval = _groupby_chunks([df], iter([]), columns, how)
+        else:
+            df = _concat_chunks(itertools.chain([df], chunks), replay)
+        if retval is not None:
+            if not as_index:
+                retval = retval.reset_index()
+            pipeout(retval)
+            return
+    else:
+        df = pipein()
+        _assert_cols(df, columns, "groupby")
+
+    grouped = df.groupby(columns, as_index=as_index, observed=True)
     try:
         fn = getattr(grouped, how)
     except AttributeError:
@@ -706,6 +2491,456 @@ def groupby(*columns, how="sum", as_index=False):
     pipeout(retval)
 
 
+# How to merge the per chunk results of groupby --how=..., see _groupby_chunks
+_GROUPBY_MERGE = {
+    "sum": "sum",
+    "prod": "prod",
+    "count": "sum",
+    "min": "min",
+    "max": "max",
+    "first": "first",
+    "last": "last",
+    "mean": None,
+    "var": None,
+    "std": None,
+}
+
+
+def _assert_same_types(df, first):
+    """Raise _TypesChanged if a chunk has other column types than the first.
+
+    Chunks are parsed on their own, so a column that is int in the first
+    chunk may be float (with a missing value) or text in a later one.  The
+    commands then read all input at once, see _Replay.  Returns df.
+
+    """
+    if _kinds(df) != _kinds(first) or list(df.columns) != list(first.columns):
+        raise _TypesChanged()
+    return df
+
+
+def _kinds(df):
+    """The kinds of the column types of df: int, float, bool, object, ..."""
+    import numpy
+
+    return [
+        dtype.kind if isinstance(dtype, numpy.dtype) else str(dtype)
+        for dtype in df.dtypes
+    ]
+
+
+def _exact_merge(df, columns, how):
+    """True if the per chunk results of groupby --how=how merge exactly.
+
+    Products of floats depend on the order of multiplication, so prod is
+    only merged for integers.  Sums are exact, see _ExactSums.
+
+    """
+    if not _numeric_values(df, columns):
+        return False
+    if how == "prod" and any(
+        pd.api.types.is_float_dtype(df[col]) for col in df.columns if col not in columns
+    ):
+        return False
+    return True
+
+
+def _numeric_values(df, columns):
+    """True if all columns of df but the given ones are (non-bool) numbers."""
+    return all(
+        pd.api.types.is_numeric_dtype(df[col])
+        and not pd.api.types.is_bool_dtype(df[col])
+        for col in df.columns
+        if col not in columns
+    )
+
+
+def _groupby_chunks(head, chunks, columns, how):
+    """Group chunks by columns and aggregate them with how.
+
+    Each chunk is aggregated on its own and merged into the result so far,
+    so memory grows with the number of groups, not with the number of rows.
+    Sums of floats, mean, var and std are kept as exact sums.  Raises
+    _TypesChanged if a chunk cannot be merged exactly, see _exact_merge.
+
+    """
+    import itertools
+
+    state = sums = None
+    values = [col for col in head[0].columns if col not in columns]
+    if how == "sum":
+        values = [col for col in values if pd.api.types.is_float_dtype(head[0][col])]
+    if values and how in ("sum", "mean", "var", "std"):
+        sums = _ExactSums(columns, values, squares=how in ("var", "std"))
+    for df in itertools.chain(head, chunks):
+        _assert_same_types(df, head[0])
+        if not _exact_merge(df, columns, how):
+            raise _TypesChanged()
+        if sums is not None:
+            sums.update(df)
+            df = df.drop(columns=sums.values)
+            if how != "sum":
+                continue
+        part = getattr(df.groupby(columns, observed=True), how)()
+        state = part if state is None else _groupby_merge(state, part, how)
+
+    if sums is None:
+        return state
+    result = sums.result(how)
+    if state is None:
+        return result
+    order = [col for col in head[0].columns if col not in columns]
+    return pd.concat([state, result], axis=1)[order]
+
+
+def _groupby_merge(state, part, how):
+    """Merge the partial groupby results state and part."""
+    both = pd.concat([state, part])
+    grouped = both.groupby(level=list(range(both.index.nlevels)), observed=True)
+    return getattr(grouped, _GROUPBY_MERGE[how])()
+
+
+class _ExactSums(object):
+    """Exact sums of the values, and of their squares, of columns per group.
+
+    A finite float is an int of at most 53 bits times a power of two.  Its
+    bits are split into digits of 27 bits, at bit positions that are
+    multiples of 27, and the digits at each position are summed as floats,
+    which is exact as long as the sums stay below 2**53 (larger sums are
+    carried to the next position).  A square is x * x plus its rounding
+    error, by Dekker's product.  So the sums do not depend on the order of
+    the rows, or on the chunks they come in, and are rounded once, at the
+    end, see _digits.  Infinite values are summed on their own.
+
+    The digit sums take some 50 bytes per group and column, and 120 with
+    the squares, which is more than the rows of groups of a few rows take.
+
+    """
+
+    # make the bit positions non-negative, of values down to 2**-1100, and of
+    # squares and the products of _deviations down to 2**-2377
+    SHIFT = {1: 1153, 2: 2430}
+
+    def __init__(self, columns, values, squares=False):
+        import numpy
+
+        self.columns, self.values = columns, values
+        self.powers = (1, 2) if squares else (1,)
+        self.groups = None
+        # the digit sums, keyed by group, value, power and position, and the
+        # digit sums of blocks of rows not yet added to them
+        self.keys, self.sums = numpy.empty(0, dtype=int), numpy.empty(0)
+        self.blocks = []
+        self.count = self.special = numpy.empty((0, len(values)))
+
+    def update(self, df):
+        """Add the rows of df to the sums."""
+        import numpy
+
+        grouped = df.groupby(self.columns, observed=True)
+        codes = grouped.ngroup().to_numpy()
+        groups = grouped.size().index
+        if self.groups is None:
+            self.groups = groups[:0]
+        ids = self.groups.get_indexer(groups)
+        new = ids < 0
+        ids[new] = numpy.arange(len(self.groups), len(self.groups) + new.sum())
+        self.groups = self.groups.append(groups[new])
+        ngroups = len(self.groups)
+
+        valid = codes >= 0
+        group = ids[codes[valid]]
+        frame = df[self.values].to_numpy(dtype=float)[valid]
+        special = numpy.where(numpy.isinf(frame), frame, 0.0)
+        # in blocks of rows, whose digit sums are below 2**20 * 2**27
+        for start in range(0, len(frame), 2**20):
+            block = slice(start, start + 2**20)
+            keys, sums = [], []
+            for pos in range(len(self.values)):
+                x = frame[block, pos]
+                ok = numpy.isfinite(x)
+                code, x = group[block][ok], x[ok]
+                if 2 in self.powers:
+                    # the square overflows, and so does the variance
+                    with numpy.errstate(over="ignore"):
+                        huge = ~numpy.isfinite(x * x)
+                    special[start + numpy.flatnonzero(ok)[huge], pos] = numpy.inf
+                    code, x = code[~huge], x[~huge]
+                for power in self.powers:
+                    for term in [x] if power == 1 else _product(x, x):
+                        digit, limbs = _float_digits(term, self.SHIFT[power] - 53)
+                        cell = ((code * len(self.values) + pos) * 2 + power - 1) * 256
+                        for idx, limb in enumerate(limbs):
+                            keys.append(cell + digit + idx)
+                            sums.append(limb)
+            self.blocks.append(
+                _add_digits(numpy.concatenate(keys), numpy.concatenate(sums))
+            )
+            # add up blocks rarely, but before their sums could reach 2**53
+            if len(self.blocks) == 16 or sum(
+                len(keys) for keys, sums in self.blocks
+            ) > len(self.keys):
+                self.add_blocks()
+
+        # not DataFrame.groupby().sum(), whose Kahan summation makes inf NaN
+        def add(state, weights):
+            state = numpy.pad(state, ((0, ngroups - len(state)), (0, 0)))
+            for pos in range(len(self.values)):
+                state[:, pos] += numpy.bincount(
+                    group, weights=weights[:, pos], minlength=ngroups
+                )
+            return state
+
+        self.count = add(self.count, ~numpy.isnan(frame))
+        self.special = add(self.special, special)
+
+    def add_blocks(self):
+        """Add the digit sums of the blocks to the digit sums."""
+        import numpy
+
+        self.keys, self.sums = _add_digits(
+            numpy.concatenate([self.keys] + [keys for keys, sums in self.blocks]),
+            numpy.concatenate([self.sums] + [sums for keys, sums in self.blocks]),
+        )
+        self.blocks = []
+
+    def result(self, how):
+        """The sum, mean, var or std of each group and column, a DataFrame."""
+        import numpy
+
+        self.add_blocks()
+        count, special = self.count.ravel(), self.special.ravel()
+        keys, digits, negative = _digits(self.keys, self.sums)
+        first = (keys >> 8) & 1 == 0
+        sums = numpy.zeros(len(count))
+        with numpy.errstate(over="ignore", invalid="ignore", divide="ignore"):
+            cells, values = _round_digits(
+                keys[first], digits[first], negative[first], self.SHIFT[1]
+            )
+            sums[cells >> 1] = values
+            if how == "sum":
+                result = sums
+            elif how == "mean":
+                result = sums / count
+            else:
+                result = self._deviations(keys, digits, negative, sums / count)
+                result = numpy.maximum(result, 0) / (count - 1)
+                result[(count < 2) | (special != 0)] = numpy.nan
+                result = numpy.sqrt(result) if how == "std" else result
+        if how in ("sum", "mean"):
+            result = numpy.where(special != 0, special, result)
+        result = result.reshape(self.count.shape)
+        result = pd.DataFrame(result, index=self.groups, columns=self.values)
+        return result.sort_index()
+
+    def _deviations(self, keys, digits, negative, mean):
+        """The sums of the squared deviations from mean, per cell.
+
+        sum((x - mean) ** 2) == sum(x * x) - 2 * mean * sum(x) + n * mean ** 2,
+        which is summed exactly from the products, by Dekker's product, of
+        the mean and the digits of the exact sums.  The mean is scaled to
+        [0.5, 1), and the rest with it, so that the products do not overflow.
+
+        """
+        import numpy
+
+        count = self.count.ravel()
+        mean = numpy.where(numpy.isfinite(mean), mean, 0.0)
+        mean, scale = numpy.frexp(mean)
+        cell = keys >> 9
+        first = (keys >> 8) & 1 == 0
+        cell, digit = cell[first], keys[first] & 255
+        value = numpy.where(negative[first], -digits[first], digits[first])
+        value = numpy.ldexp(value, 27 * digit - self.SHIFT[1] - scale[cell])
+        terms = [_product(-2 * mean[cell], value)]
+        cells = [cell, cell]
+        high, low = _product(mean, mean)
+        terms += [_product(count, high), _product(count, low)]
+        cells += [numpy.arange(len(count))] * 4
+        keys, sums = [keys[~first]], [numpy.where(negative, -digits, digits)[~first]]
+        for cell, term in zip(cells, (term for pair in terms for term in pair)):
+            shift = self.SHIFT[2] - 53 + 2 * scale[cell]
+            position, limbs = _float_digits(term, shift)
+            for idx, limb in enumerate(limbs):
+                keys.append((cell * 2 + 1) * 256 + position + idx)
+                sums.append(limb)
+        keys, sums = _add_digits(numpy.concatenate(keys), numpy.concatenate(sums))
+        keys, digits, negative = _digits(keys, sums)
+        deviations = numpy.zeros(len(count))
+        cells, values = _round_digits(keys, digits, negative, self.SHIFT[2])
+        deviations[cells >> 1] = values
+        return deviations
+
+
+def _float_digits(x, shift):
+    """Split the floats x into digits of 27 bits at multiples of 27 bits.
+
+    Returns the position of the lowest digit of each value and the three
+    digits, low to high, which are ints (as floats) below 2**27.  Digit d is
+    worth 2**(27 * d - shift - 53) at position 0.
+
+    """
+    import numpy
+
+    fraction, exponent = numpy.frexp(numpy.abs(x))
+    position, bits = numpy.divmod(exponent + shift, 27)
+    # the 53 bits of x, moved up by bits, an int below 2**80
+    value = numpy.ldexp(numpy.ldexp(fraction, 53), bits)
+    high = numpy.floor(value / 2.0**54)
+    value = value - high * 2.0**54
+    middle = numpy.floor(value / 2.0**27)
+    low = value - middle * 2.0**27
+    sign = numpy.sign(x)
+    return position, (low * sign, middle * sign, high * sign)
+
+
+def _product(x, y):
+    """x * y and its rounding error, by Dekker's product, so exactly."""
+    product = x * y
+    split = 134217729.0 * x
+    xhigh = split - (split - x)
+    xlow = x - xhigh
+    split = 134217729.0 * y
+    yhigh = split - (split - y)
+    ylow = y - yhigh
+    error = ((xhigh * yhigh - product) + xhigh * ylow + xlow * yhigh) + xlow * ylow
+    return product, error
+
+
+def _add_digits(keys, sums):
+    """Add up the digit sums with equal keys, see _ExactSums.
+
+    Returns the keys, sorted, and their sums, without zero sums.
+
+    """
+    import numpy
+
+    if len(keys) and keys.max() < 4 * len(keys):
+        sums = numpy.bincount(keys, weights=sums)
+        keys = numpy.flatnonzero(sums)
+        return _merge_digits(keys, sums[keys], keys[:0], sums[:0])
+    order = numpy.argsort(keys, kind="stable")
+    keys, sums = keys[order], sums[order]
+    starts = numpy.flatnonzero(numpy.diff(keys, prepend=-1))
+    if len(sums):
+        keys, sums = keys[starts], numpy.add.reduceat(sums, starts)
+    return _merge_digits(keys, sums, keys[:0], sums[:0])
+
+
+def _merge_digits(keys, sums, more, more_sums):
+    """Add two sorted sets of digit sums, see _add_digits, carrying large sums."""
+    import numpy
+
+    idx = numpy.searchsorted(keys, more)
+    found = keys[numpy.minimum(idx, len(keys) - 1)] == more if len(keys) else idx < 0
+    sums = sums.copy()
+    sums[idx[found]] += more_sums[found]
+    keys = numpy.insert(keys, idx[~found], more[~found])
+    sums = numpy.insert(sums, idx[~found], more_sums[~found])
+    keys, sums = keys[sums != 0], sums[sums != 0]
+    if not len(sums) or numpy.abs(sums).max() < 2.0**52:
+        return keys, sums
+    carry = numpy.floor(sums / 2.0**27)
+    more = carry != 0
+    return _merge_digits(keys, sums - carry * 2.0**27, keys[more] + 1, carry[more])
+
+
+def _digits(keys, sums):
+    """The base 2**27 digits of the absolute values of sums of digits.
+
+    keys and sums are as returned by _add_digits, and keys >> 8 are cells
+    of which the sums are added up.  Returns the keys, sorted, the digits,
+    which are below 2**27 and not 0, and whether the sum of the cell of
+    each key is negative.  These depend only on the sums of the cells, not
+    on how they were added up.
+
+    """
+    import numpy
+
+    negative = None
+    while len(keys):
+        cells = keys >> 8
+        top = numpy.append(cells[1:] != cells[:-1], True)
+        # leave the highest digit of each cell to carry its sign
+        carry = numpy.floor(sums / 2.0**27)
+        carry[top & (numpy.abs(sums) < 2.0**27)] = 0
+        if carry.any():
+            more = carry != 0
+            keys, sums = _merge_digits(
+                keys, sums - carry * 2.0**27, keys[more] + 1, carry[more]
+            )
+        elif negative is None:
+            negative = cells[top][sums[top] < 0]
+            sums = numpy.where(_isin(cells, negative), -sums, sums)
+        else:
+            return keys, sums, _isin(cells, negative)
+    return keys, sums, numpy.zeros(0, dtype=bool)
+
+
+def _isin(values, sorted_values):
+    """numpy.isin for sorted_values sorted, faster."""
+    import numpy
+
+    if not len(sorted_values):
+        return numpy.zeros(len(values), dtype=bool)
+    idx = numpy.minimum(
+        numpy.searchsorted(sorted_values, values), len(sorted_values) - 1
+    )
+    return sorted_values[idx] == values
+
+
+def _round_digits(keys, digits, negative, shift):
+    """The nearest floats to the numbers given by the digits of _digits.
+
+    The digit at position d of a cell is worth 2**(27 * d - shift).  Returns
+    the cells and their floats.
+
+    """
+    import numpy
+
+    if not len(keys):
+        return keys, digits
+    cells = keys >> 8
+    top = numpy.flatnonzero(numpy.append(cells[1:] != cells[:-1], True))
+    start = numpy.flatnonzero(numpy.append(True, cells[1:] != cells[:-1]))
+    key = keys[top]
+
+    def digit(offset):
+        idx = numpy.minimum(numpy.searchsorted(keys, key - offset), top)
+        return numpy.where(keys[idx] == key - offset, digits[idx], 0).astype("int64")
+
+    # the 63 highest bits of the three highest digits, and whether any bit
+    # below them is set, which rounds like all of them
+    high, middle, low = digit(0), digit(1), digit(2)
+    drop = numpy.maximum(numpy.frexp(digits[top])[1] - 9, 0)
+    window = (((high << 27) | middle) << (27 - drop)) | (low >> drop)
+    sticky = (low & ((1 << drop) - 1)) != 0
+    sticky |= numpy.searchsorted(keys, key - 2) > start
+    value = numpy.ldexp(
+        (window | sticky).astype(float), 27 * (key & 255) - 54 + drop - shift
+    )
+    return cells[top], numpy.where(negative[top], -value, value)
+
+
+def _merge_moments(state, part):
+    """Merge (count, mean, sum of squared deviations) of two parts of data.
+
+    The parts are Series or DataFrames, aligned on their index.  Uses the
+    parallel variant of Welford's algorithm by Chan et al.
+
+    """
+    index = state[0].index.union(part[0].index)
+    (na, ma, m2a), (nb, mb, m2b) = [
+        [frame.reindex(index) for frame in partial] for partial in (state, part)
+    ]
+    na, nb = na.fillna(0), nb.fillna(0)
+    count = na + nb
+    delta = mb - ma
+    mean = (ma + delta * nb / count).where(nb > 0, ma).where(na > 0, mb)
+    m2 = m2a.fillna(0) + m2b.fillna(0) + (delta**2 * na * nb / count).fillna(0)
+    return count, mean, m2
+
+
 @register
 def rolling(window, *columns, how="sum", win_type=None, std=None, beta=None, tau=None):
     """Rolling window calculations using provided `how` function.
@@ -715,37 +2950,82 @@ def rolling(window, *columns, how="sum", win_type=None, std=None, beta=None, tau
            cat a.csv | ph rolling 5 colA colB --how=mean
            cat a.csv | ph rolling 5 --win_type=gaussian --std=7.62
     """
-    df = pipein()
-    orig_columns = list(df.columns)
+    import itertools
+
     columns = list(columns)
-    _assert_cols(df, columns, "rolling")
 
-    if not columns:
-        columns = list(df.columns)
+    def rolling_(df):
+        orig_columns = list(df.columns)
+        _assert_cols(df, columns, "rolling")
+        rolled = columns or orig_columns
 
-    noncols = [c for c in df.columns if c not in columns]
+        noncols = [c for c in df.columns if c not in rolled]
 
-    rollin = df[columns].rolling(window, win_type=win_type)
-    nonrollin = df[noncols]
-    try:
-        fn = getattr(rollin, how)
-    except AttributeError:
-        sys.exit("Unknown --how={}, should be sum, mean, ...".format(how))
+        rollin = df[rolled].rolling(window, win_type=win_type)
+        nonrollin = df[noncols]
+        try:
+            fn = getattr(rollin, how)
+        except AttributeError:
+            sys.exit("Unknown --how={}, should be sum, mean, ...".format(how))
+
+        if {std, beta, tau} != {None}:
+            retval = fn(std=std, beta=beta, tau=tau)
+        else:
+            retval = fn()
+
+        df = pd.concat([retval, nonrollin], axis=1)
+        for col in orig_columns:
+            if col not in df.columns:
+                op = "ph rolling"
+                sys.exit(
+                    '{}: Could not perform rolling window on column "{}"'.format(
+                        op, col
+                    )
+                )
+        return df[orig_columns]
 
-    if {std, beta, tau} != {None}:
-        retval = fn(std=std, beta=beta, tau=tau)
+    if not isinstance(window, int) or window <= 0:
+        pipeout(rolling_(pipein()))
+        return
+    replay = _Replay()
+    chunks = _pipein_chunks(replay)
+    df = next(chunks)
+    _assert_cols(df, columns, "rolling")
+    rolled = columns or list(df.columns)
+    # Only windows that are computed independently of the rows before them
+    # can be computed chunk by chunk, sums of floats depend on all earlier
+    # rows.  Sums of integers are exact.
+    if win_type is not None:
+        exact = how in ("sum", "mean")
+    elif how in ("sum", "mean"):
+        exact = all(pd.api.types.is_integer_dtype(df[col]) for col in rolled)
+        if exact:
+            chunks = (_assert_integral(chunk, rolled) for chunk in chunks)
     else:
-        retval = fn()
+        exact = how in ("count", "min", "max", "median")
+    if not exact:
+        pipeout(rolling_(_concat_chunks(itertools.chain([df], chunks), replay)))
+        return
+    chunks = (_assert_same_types(chunk, df) for chunk in itertools.chain([df], chunks))
+    try:
+        _stream_context(rolling_, before=window - 1, chunks=_hold(chunks))
+    except _TypesChanged:
+        pipeout(rolling_(replay.frame()))
 
-    df = pd.concat([retval, nonrollin], axis=1)
-    for col in orig_columns:
-        if col not in df.columns:
-            op = "ph rolling"
-            sys.exit(
-                '{}: Could not perform rolling window on column "{}"'.format(op, col)
-            )
-    df = df[orig_columns]
-    pipeout(df)
+
+def _assert_integral(df, columns):
+    """Raise _TypesChanged if columns of a chunk hold non-integral numbers.
+
+    Returns df.
+
+    """
+    for col in columns:
+        values = df[col].dropna()
+        if not pd.api.types.is_numeric_dtype(values) or (
+            (values != values.round()).any()
+        ):
+            raise _TypesChanged()
+    return df
 
 
 @register
@@ -778,29 +3058,78 @@ def ewm(
            cat a.csv | ph ewm --halflife=0.5 --how=std
 
     """
+    import itertools
+    import numpy
+
     if {com, span, halflife, alpha} == {None}:
         sys.exit("Must pass one of com, span, halflife, or alpha")
+    for name, flag in (("adjust", adjust), ("ignore_na", ignore_na)):
+        if flag not in TRUTHY + FALSY:
+            sys.exit("--{}=True or False, not {}".format(name, flag))
+    adjust = adjust in TRUTHY
+    ignore_na = ignore_na in TRUTHY
+
+    def ewm_(df, min_periods=min_periods):
+        ewm_ = df.ewm(
+            min_periods=min_periods,
+            adjust=adjust,
+            ignore_na=ignore_na,
+            axis=axis,
+            com=com,
+            span=span,
+            halflife=halflife,
+            alpha=alpha,
+        )
+        try:
+            fn = getattr(ewm_, how)
+        except AttributeError:
+            sys.exit(
+                "Unknown --how={}, should be mean, var, std, corr, cov..".format(how)
+            )
+        return fn()
 
-    df = pipein()
-
-    ewm_ = df.ewm(
-        min_periods=min_periods,
-        adjust=adjust,
-        ignore_na=ignore_na,
-        axis=axis,
-        com=com,
-        span=span,
-        halflife=halflife,
-        alpha=alpha,
-    )
-    try:
-        fn = getattr(ewm_, how)
-    except AttributeError:
-        sys.exit("Unknown --how={}, should be mean, var, std, corr, cov..".format(how))
+    if axis in (1, "columns"):
+        _stream(ewm_)
+        return
+    replay = _Replay()
+    chunks = _pipein_chunks(replay)
+    df = next(chunks)
+    if how != "mean" or adjust or not _numeric_values(df, []):
+        pipeout(ewm_(_concat_chunks(itertools.chain([df], chunks), replay)))
+        return
 
-    retval = fn()
+    # Without adjust, the average after an observation only depends on the
+    # previous average and the number of N/A values since, so a chunk is
+    # averaged after the last average and the N/A values following it.
+    last = {col: (float("nan"), 0, 0) for col in df.columns}
+
+    def mean_(chunk):
+        _assert_same_types(chunk, df)
+        retval = pd.DataFrame(index=chunk.index)
+        for col in chunk.columns:
+            average, nas, count = last[col]
+            prefix = [] if average != average else [average] + [float("nan")] * nas
+            values = pd.concat(
+                [pd.Series(prefix, dtype=float), chunk[col].astype(float)],
+                ignore_index=True,
+            )
+            means = ewm_(values.to_frame(), min_periods=0)[0].to_numpy()[len(prefix) :]
+            observed = chunk[col].notna().to_numpy()
+            counts = count + observed.cumsum()
+            retval[col] = numpy.where(counts < max(min_periods, 1), numpy.nan, means)
+            if observed.any():
+                pos = observed.nonzero()[0][-1]
+                last[col] = means[pos], len(chunk) - pos - 1, counts[-1]
+            elif average == average:
+                last[col] = average, nas + len(chunk), count
+        return retval
 
-    pipeout(retval)
+    try:
+        frames = _hold(mean_(chunk) for chunk in itertools.chain([df], chunks))
+    except _TypesChanged:
+        pipeout(ewm_(replay.frame()))
+        return
+    _pipeout_chunks(frames)
 
 
 @register
@@ -824,7 +3153,8 @@ def expanding(min_periods=1, axis=0, how="sum", quantile=None):
 
     """
 
-    df = pipein()
+    import itertools
+    import numpy
 
     if quantile is not None:
         if how != "quantile":
@@ -832,18 +3162,68 @@ def expanding(min_periods=1, axis=0, how="sum", quantile=None):
     if how == "quantile" and quantile is None:
 
         sys.exit("--how=quantile needs --quantile=<float>, e.g. --quantile=0.25")
-    expanding_ = df.expanding(min_periods=min_periods, axis=axis)
-    try:
-        fn = getattr(expanding_, how)
-    except AttributeError:
-        sys.exit("Unknown --how={}, should be sum, mean, max, quantile..".format(how))
 
-    if how == "quantile":
-        retval = fn(quantile)
+    def expanding_(df):
+        expanding_ = df.expanding(min_periods=min_periods, axis=axis)
+        try:
+            fn = getattr(expanding_, how)
+        except AttributeError:
+            sys.exit(
+                "Unknown --how={}, should be sum, mean, max, quantile..".format(how)
+            )
+
+        if how == "quantile":
+            return fn(quantile)
+        return fn()
+
+    if axis in (1, "columns"):
+        _stream(expanding_)
+        return
+    replay = _Replay()
+    chunks = _pipein_chunks(replay)
+    df = next(chunks)
+    if how in ("sum", "mean"):
+        # sums of integers do not depend on the order of summation
+        exact = all(pd.api.types.is_integer_dtype(df[col]) for col in df.columns)
+        if exact:
+            chunks = (_assert_integral(chunk, df.columns) for chunk in chunks)
     else:
-        retval = fn()
+        exact = how in ("count", "min", "max") and _numeric_values(df, [])
+    if not exact or not isinstance(min_periods, int):
+        pipeout(expanding_(_concat_chunks(itertools.chain([df], chunks), replay)))
+        return
 
-    pipeout(retval)
+    # the count, sum, min and max of all rows before the chunk
+    last = numpy.zeros((4, len(df.columns)))
+    last[2:] = numpy.nan
+
+    def aggregate(chunk):
+        _assert_same_types(chunk, df)
+        values = chunk.to_numpy(dtype=float)
+        observed = ~numpy.isnan(values)
+        count = last[0] + observed.cumsum(axis=0)
+        total = last[1] + numpy.where(observed, values, 0).cumsum(axis=0)
+        low = numpy.fmin.accumulate(numpy.vstack([last[2:3], values]))[1:]
+        high = numpy.fmax.accumulate(numpy.vstack([last[3:4], values]))[1:]
+        if len(chunk):
+            last[:] = count[-1], total[-1], low[-1], high[-1]
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            retval = {
+                "count": count,
+                "sum": total,
+                "mean": total / count,
+                "min": low,
+                "max": high,
+            }[how]
+        retval = numpy.where(count >= min_periods, retval, numpy.nan)
+        return pd.DataFrame(retval, index=chunk.index, columns=chunk.columns)
+
+    try:
+        frames = _hold(aggregate(chunk) for chunk in itertools.chain([df], chunks))
+    except _TypesChanged:
+        pipeout(expanding_(replay.frame()))
+        return
+    _pipeout_chunks(frames)
 
 
 @register
@@ -954,8 +3334,16 @@ def eval(expr):
     Example:  cat a.csv | ph eval "z = x + y"
 
     """
-    df = pipein()
-    pipeout(df.eval(expr))
+
+    def eval_(df):
+        retval = df.eval(expr)
+        if isinstance(retval, pd.Series):  # expr without assignment
+            retval = retval.to_frame()
+        return retval
+
+    # without an assignment, the result has none of the other columns
+    assigns = re.search(r"(?<![=!<>])=(?!=)", re.sub(r"`[^`]*`", "", expr))
+    _stream(eval_, lazy=_expr_names(expr) if assigns else None)
 
 
 @register
@@ -1012,11 +3400,13 @@ def date(col=None, unit=None, origin="unix", errors="raise", dayfirst=False, **k
         ]
     if kwargs.get("utc") in TRUTHY:
         date_parser = lambda d: [datetime.datetime.utcfromtimestamp(e) for e in d]
-    df = pipein()
-    try:
-        if col is None:
-            df = pd.to_datetime(df, unit=unit, origin=origin, errors=errors)
-        else:
+
+    def date_(df):
+        try:
+            if col is None:
+                return pd.to_datetime(
+                    df, unit=unit, origin=origin, errors=errors
+                ).to_frame()
             _assert_col(df, col, "date")
             if date_parser is None:
                 df[col] = pd.to_datetime(
@@ -1024,10 +3414,11 @@ def date(col=None, unit=None, origin="unix", errors="raise", dayfirst=False, **k
                 )
             else:
                 df[col] = date_parser(df[col])
-    except Exception as err:
-        sys.exit(err)
+        except Exception as err:
+            sys.exit(err)
+        return df
 
-    pipeout(df)
+    _stream(date_, lazy=None if col is None else [col])
 
 
 @register
@@ -1036,20 +3427,50 @@ def round(col, decimals=0):
 
     Usage: cat a.csv | ph round x 2
     """
-    df = pipein()
-    _assert_col(df, col, "round")
-    df[col] = df[col].round(decimals=decimals)
-    pipeout(df)
+
+    def round_(df):
+        _assert_col(df, col, "round")
+        df[col] = df[col].round(decimals=decimals)
+        return df
+
+    _stream(round_, lazy=[col])
+
 
 @register
-def describe():
+def describe(*args):
     """Run DataFrame's describe method.
 
     The result is NOT tabular data, so pipeline ends.
 
+    Input larger than --chunksize rows is described chunk by chunk, with
+    the percentiles estimated by a t-digest; use --exact to read all input
+    at once and compute exact percentiles.
+
     Usage: cat a.csv | ph describe
+           cat a.csv | ph describe --exact
     """
-    df = pipein()
+    import itertools
+
+    unknown = [arg for arg in args if arg != "--exact"]
+    if unknown:
+        sys.exit("Unknown argument to describe: {}".format(unknown[0]))
+    if "--exact" in args:
+        df = pipein()
+    else:
+        replay = _Replay()
+        chunks = _pipein_chunks(replay)
+        df = next(chunks)
+        second = next(chunks, None)
+        if second is not None and len(df.select_dtypes("number").columns):
+            try:
+                out = _describe_chunks([df, second], chunks)
+            except _TypesChanged:
+                df, second = replay.frame(), None
+            else:
+                _safe_out(out)
+                return
+        if second is not None:
+            df = _concat_chunks(itertools.chain([df, second], chunks), replay)
     try:
         out = df.describe()
     except ValueError as err:
@@ -1057,15 +3478,149 @@ def describe():
     _safe_out(out)
 
 
+def _describe_chunks(head, chunks):
+    """Describe the numeric columns of chunks, like DataFrame.describe.
+
+    count, mean, std, min and max are merged exactly per chunk, while the
+    quartiles come from a t-digest per column.
+
+    """
+    import itertools
+
+    columns = head[0].select_dtypes("number").columns
+    digests = {col: _TDigest() for col in columns}
+    state = None
+    for df in itertools.chain(head, chunks):
+        _assert_same_types(df, head[0])
+        df = df[columns]
+        count = df.count()
+        part = (
+            count,
+            df.sum(),
+            df.min(),
+            df.max(),
+            (count, df.mean(), df.var(ddof=0) * count),
+        )
+        if state is None:
+            state = part
+        else:
+            state = (
+                state[0] + part[0],
+                state[1] + part[1],
+                pd.concat([state[2], part[2]], axis=1).min(axis=1),
+                pd.concat([state[3], part[3]], axis=1).max(axis=1),
+                _merge_moments(state[4], part[4]),
+            )
+        for col in columns:
+            digests[col].update(df[col].dropna().to_numpy(dtype=float))
+
+    count, total, low, high, (_, _, m2) = state
+    rows = [
+        count,
+        total / count,
+        ((m2 / (count - 1)).where(count > 1)) ** 0.5,
+        low,
+    ]
+    for q in (0.25, 0.5, 0.75):
+        rows.append(pd.Series({col: digests[col].quantile(q) for col in columns}))
+    rows.append(high)
+    return pd.DataFrame(
+        rows,
+        index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"],
+        dtype=float,
+    )
+
+
+class _TDigest(object):
+    """A merging t-digest (Dunning and Ertl) for estimating quantiles.
+
+    Values are summarized by centroids (mean, weight), sorted by mean.
+    With the arcsine scale function the centroids are single values at the
+    tails and hold about pi / compression of all values in the middle, so
+    the size is independent of the number of values.
+
+    """
+
+    def __init__(self, compression=1000):
+        import numpy
+
+        self.compression = compression
+        self.means = numpy.empty(0)
+        self.weights = numpy.empty(0)
+
+    def update(self, values):
+        """Add the (non-NaN) values to the digest and compress it."""
+        import numpy
+
+        means = numpy.concatenate([self.means, values])
+        weights = numpy.concatenate([self.weights, numpy.ones(len(values))])
+        if not len(means):
+            return
+        order = numpy.argsort(means, kind="mergesort")
+        means, weights = means[order], weights[order]
+        left = (numpy.cumsum(weights) - weights) / weights.sum()
+        scale = self.compression / (2 * numpy.pi) * numpy.arcsin(2 * left - 1)
+        bins = numpy.floor(scale)
+        starts = numpy.flatnonzero(numpy.r_[True, bins[1:] != bins[:-1]])
+        self.weights = numpy.add.reduceat(weights, starts)
+        # clip, so a centroid of equal values has exactly that value as mean
+        self.means = numpy.clip(
+            numpy.add.reduceat(means * weights, starts) / self.weights,
+            numpy.minimum.reduceat(means, starts),
+            numpy.maximum.reduceat(means, starts),
+        )
+
+    def quantile(self, q):
+        """Estimate the q quantile, interpolating linearly like pandas."""
+        import numpy
+
+        if not len(self.means):
+            return numpy.nan
+        centers = numpy.cumsum(self.weights) - self.weights / 2
+        rank = q * (self.weights.sum() - 1) + 0.5
+        return numpy.interp(rank, centers, self.means)
+
+
 @register
-def info():
+def info(*args):
     """Run DataFrame's info method.
 
-    The result is NOT tabular data, so pipeline ends.
+    The result is NOT tabular data, so pipeline ends.
+
+    Usage: cat a.csv | ph info
+           cat a.csv | ph info --compact
+
+    With --compact, the memory usage in the smallest column types that
+    write the same csv is reported, see _compact_frame.
+
+    """
+    unknown = [arg for arg in args if arg != "--compact"]
+    if unknown:
+        sys.exit("Unknown argument to info: {}".format(unknown[0]))
+    if "--compact" not in args:
+        print(pipein().info())
+        return
+    df = pipein()
+    before = df.memory_usage(deep=True).sum()
+    df = _compact_frame(df)
+    after = df.memory_usage(deep=True).sum()
+    df.info(memory_usage="deep")
+    print(
+        "compact: {} instead of {} ({:.1f}x smaller)".format(
+            _memory_size(after), _memory_size(before), before / max(after, 1)
+        )
+    )
+
 
-    Usage: cat a.csv | ph info
-    """
-    print(pipein().info())
+def _memory_size(num):
+    """num bytes in the units of DataFrame.info, e.g. 1.2 KB."""
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if num < 1024:
+            break
+        num /= 1024.0
+    else:
+        unit = "TB"
+    return "{:3.1f} {}".format(num, unit)
 
 
 @register
@@ -1079,6 +3634,7 @@ def to(ftype, fname=None, sep=None, index=False):
            cat a.csv | ph to tsv
            cat a.csv | ph to csv --index=True
            cat a.csv | ph to csv --sep=';'
+           cat a.csv | ph to csv --float-format=%.3f
            cat a.csv | ph to clipboard
            cat a.csv | ph to json
            cat a.csv | ph to parquet out.parquet
@@ -1116,6 +3672,10 @@ def to(ftype, fname=None, sep=None, index=False):
     writer = WRITERS[ftype]
     df = pipein()
     fn = getattr(df, writer)
+    if writer == "to_csv":
+        import functools
+
+        fn = functools.partial(_to_csv, df)
     kwargs = {}
     if ftype == "tsv":
         kwargs["sep"] = "\t"
@@ -1189,14 +3749,24 @@ def cat(*fnames, axis="index"):
     else:
         dfs = []
         for fname in fnames:
-            df = pd.read_csv(fname)
+            df = _read_csv(fname)
             dfs.append(df)
         retval = pd.concat(dfs, axis=axis)
         pipeout(retval)
 
 
 @register
-def merge(fname1, fname2, how="inner", on=None, left=None, right=None):
+def merge(
+    fname1,
+    fname2,
+    *flags,
+    how=None,
+    on=None,
+    left=None,
+    right=None,
+    by=None,
+    tolerance=None,
+):
     """Merging two csv files.
 
     If the two files have a common column name, then the merge will be
@@ -1209,32 +3779,396 @@ def merge(fname1, fname2, how="inner", on=None, left=None, right=None):
     Choose between left merge, right merge, inner merge and outer merge
     by using (e.g.) --how=inner.
 
+    An inner merge keeps the rows in the order of the first file.
+
+    One of the files can be - for standard in.  For a left or inner merge
+    with standard in as the left file (or a right merge with it as the
+    right file), standard in is then merged chunk by chunk with the other
+    file, which is read into memory.  Standard in is read twice, for the
+    column types of the merge of all of it and then chunk by chunk, see
+    _typed_chunks.
+
+    With --sorted, both files must be sorted on the keys, and they are
+    merged chunk by chunk in lockstep, so memory only grows with the number
+    of rows that share a key.  The merged chunks are kept in a temporary
+    file until all input is read.  The output is sorted on the keys.
+
+    With --asof, each row of the first file is merged with the last row of
+    the second file whose key (--on, or --left and --right) is not larger,
+    like pd.merge_asof.  Both files must be sorted on the key, which is a
+    number or a date.  Use --by=col1,col2 to only match rows with the same
+    values in these columns and --tolerance to limit how far back to look,
+    e.g. --tolerance=5 or --tolerance=10min for dates.  This is a left
+    merge, so --how does not apply, and the keys are written as they were
+    read.  The files are read chunk by chunk in lockstep, only the last row
+    of each --by group is kept in memory, and the merged chunks are kept in
+    a temporary file until all input is read.
+
     Usage: ph merge a.csv b.csv --on=ijk
            ph merge a.csv b.csv --on ijk --how=inner
            ph merge a.csv b.csv --left=key_a --right=key_b
+           cat events.csv | ph merge - users.csv --on=user --how=left
+           ph merge day1.csv day2.csv --on=id --how=outer --sorted
+           ph merge readings.csv calibrations.csv --on=time --by=sensor --asof
 
     """
+    import itertools
+
+    unknown = [flag for flag in flags if flag not in ("--sorted", "--asof")]
+    if unknown:
+        sys.exit("Unknown argument to merge: {}".format(unknown[0]))
+    if "--asof" in flags and how is not None:
+        sys.exit("merge --asof is always a left merge, --how does not apply")
+    how = "inner" if how is None else how
     hows = ("left", "right", "outer", "inner")
     if how not in hows:
         sys.exit("Unknown merge --how={}, must be one of {}".format(how, hows))
+    if fname1 == "-" and fname2 == "-":
+        sys.exit("Only one of the files to merge can be standard in (-)")
+    if "--asof" not in flags and (by is not None or tolerance is not None):
+        sys.exit("--by and --tolerance only apply to merge --asof")
+    if "--sorted" in flags or "--asof" in flags:
+        chunks1, chunks2 = _read_chunks(fname1), _read_chunks(fname2)
+        df1, df2 = next(chunks1), next(chunks2)
+        kwargs = _merge_keys(df1, df2, on, left, right)
+        names = ["standard in" if fname == "-" else fname for fname in (fname1, fname2)]
+        if "--asof" in flags:
+            if not kwargs:
+                sys.exit("merge --asof needs --on, or --left and --right")
+            if by is not None:
+                kwargs["by"] = str(by).split(",")
+                _assert_cols(df1, kwargs["by"], "merge")
+                _assert_cols(df2, kwargs["by"], "merge")
+            merged = _same_types(
+                _merge_asof([df1, df2], [chunks1, chunks2], names, kwargs, tolerance)
+            )
+        else:
+            if not kwargs:
+                kwargs = {"on": [col for col in df1.columns if col in df2.columns]}
+            merged = _same_types(
+                _merge_sorted([df1, df2], [chunks1, chunks2], names, how, kwargs)
+            )
+        _pipeout_chunks(merged)
+        return
+    # Standard in is merged chunk by chunk where pd.merge keeps its row order.
+    stream = (fname1 == "-" and how in ("left", "inner")) or (
+        fname2 == "-" and how == "right"
+    )
+
+    def read(fname):
+        if fname == "-":
+            return pipein()
+        try:
+            return _read_csv(fname)
+        except Exception as err:
+            sys.exit(str(err))
+
+    def merged(df1, df2):
+        kwargs = _merge_keys(df1, df2, on, left, right)
+        try:
+            if how == "inner":
+                return _inner_merge(df1, df2, **kwargs)
+            return pd.merge(df1, df2, how=how, **kwargs)
+        except ValueError as err:
+            sys.exit(str(err))
+
+    if not stream:
+        df1 = read(fname1)
+        pipeout(merged(df1, read(fname2)))
+        return
+    other = read(fname2 if fname1 == "-" else fname1)
+
+    def part(chunk):
+        return merged(chunk, other) if fname1 == "-" else merged(other, chunk)
+
+    # Rows without a match give the columns of the other file missing values,
+    # and make int columns float, so the types of all parts are settled first.
+    empty = []
+
+    def scan(chunk):
+        empty.append(part(chunk).iloc[:0].copy())
+
+    chunks = _typed_chunks(scan=None if how == "inner" else scan)
+    first, second = next(chunks), next(chunks, None)
+    if second is None:
+        pipeout(part(first))
+        return
+    parts = (part(chunk) for chunk in itertools.chain([first, second], chunks))
+    if empty:
+        dtypes = pd.concat(empty).dtypes
+        parts = (df.astype(dtypes) for df in parts)
+    _pipeout_chunks(parts)
+
+
+def _same_types(parts):
+    """The merged parts, all with the column types of the merge of all input.
+
+    A column gets missing values, and an int column becomes float, only in
+    the parts with rows that did not match, so all parts are merged (see
+    _hold) before the first is written.
+
+    """
+    empty = []
+
+    def kept():
+        for part in parts:
+            empty.append(part.iloc[:0].copy())
+            yield part
+
+    held = _hold(kept())
+    dtypes = pd.concat(empty).dtypes
+    return (part.astype(dtypes) for part in held)
+
+
+def _inner_merge(df1, df2, **kwargs):
+    """pd.merge(df1, df2, how="inner"), with the rows in the order of df1.
+
+    Before pandas 2.2 an inner merge groups its rows by key, so the merges
+    of the chunks of df1 would not add up to the merge of all of it.  This
+    is a left merge of the rows of df1 that have a match, which also keeps
+    the column types of an inner merge.
+
+    """
+    keys = kwargs.get("right_on", kwargs.get("on"))
+    if keys is None:
+        keys = [col for col in df1.columns if col in df2.columns]
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    name = "_merge"
+    while name in df1.columns or name in keys:
+        name = "_" + name
+    found = pd.merge(
+        df1, df2[keys].drop_duplicates(), how="left", indicator=name, **kwargs
+    )[name]
+    return pd.merge(df1[(found == "both").to_numpy()], df2, how="left", **kwargs)
+
+
+def _merge_keys(df1, df2, on, left, right):
+    """The keyword arguments for pd.merge that select the columns to merge on."""
+    if set([on, left, right]) == set([None]):
+        if not set(df1.columns).intersection(set(df2.columns)):
+            sys.exit(
+                "No common columns to perform merge on.  Merge options: on, or: left=None, right=None."
+            )
+        return {}
+    if left is None and right is None:
+        return {"on": on}
+    if left is not None and right is not None:
+        _assert_col(df1, left, "merge")
+        _assert_col(df2, right, "merge")
+        return {"left_on": left, "right_on": right}
+    sys.exit(
+        "Specify columns in both files.  left was {}, right was {}".format(left, right)
+    )
+
+
+def _read_chunks(fname):
+    """Read the csv file fname, or standard in if it is -, in chunks.
+
+    Like _pipein_chunks, yields at least one, possibly empty, DataFrame.
+
+    """
+    if fname == "-":
+        yield from _pipein_chunks()
+        return
+    chunksize = _chunksize()
     try:
-        df1 = pd.read_csv(fname1)
-        df2 = pd.read_csv(fname2)
+        reader = _read_csv(fname, chunksize=chunksize or None)
+    except pd.errors.EmptyDataError:
+        yield pd.DataFrame()
+        return
     except Exception as err:
         sys.exit(str(err))
-    if set([on, left, right]) == set([None]) and not set(df1.columns).intersection(set(df2.columns)):
-        sys.exit("No common columns to perform merge on.  Merge options: on, or: left=None, right=None.")
-    if set([on, left, right]) == set([None]):
-        pipeout(pd.merge(df1, df2, how=how))
-    else:
-        if left is None and right is None:
-            pipeout(pd.merge(df1, df2, how=how, on=on))
-        elif left is not None and right is not None:
-            _assert_col(df1, left, "merge")
-            _assert_col(df2, right, "merge")
-            pipeout(pd.merge(df1, df2, how=how, left_on=left, right_on=right))
+    if not chunksize:
+        yield reader
+        return
+    try:
+        for chunk in reader:
+            if _stdout_closed():
+                _broken_pipe()
+            yield chunk
+    except pd.errors.ParserError as err:
+        sys.exit(str(err))
+    except _TypesChanged:
+        sys.exit(_ARROW_TYPES_CHANGED)
+
+
+def _merge_sorted(frames, chunks, fnames, how, kwargs):
+    """Merge two inputs that are sorted on their keys, chunk by chunk.
+
+    frames are the first chunks of the inputs and chunks the rest.  The
+    rows with keys below the last key read from either input are complete,
+    all later rows have larger keys, so they are merged and written.  Then
+    the input(s) whose last key was the smallest read their next chunk.
+
+    """
+    keys = [kwargs.get("left_on", kwargs.get("on")), kwargs.get("right_on")]
+    keys[1] = keys[1] if keys[1] is not None else keys[0]
+    keys = [[key] if isinstance(key, str) else list(key) for key in keys]
+    last = [None, None]
+    for idx in (0, 1):
+        if len(frames[idx]):
+            _assert_cols(frames[idx], keys[idx], "merge")
+        last[idx] = _assert_sorted(frames[idx], keys[idx], None, fnames[idx])
+
+    # pd.merge orders the columns differently when one side has no rows, so
+    # take the order of a merge of two matching rows.
+    columns = pd.merge(
+        *(pd.DataFrame([[0] * len(df.columns)], columns=df.columns) for df in frames),
+        **kwargs,
+    ).columns
+
+    def merged(df1, df2):
+        try:
+            return pd.merge(df1, df2, how=how, sort=True, **kwargs)[columns]
+        except ValueError as err:
+            sys.exit(str(err))
+
+    done = [False, False]
+    while True:
+        for idx in (0, 1):
+            while not done[idx] and not len(frames[idx]):
+                _read_next(frames, chunks, fnames, keys, last, done, idx)
+        if all(done):
+            yield merged(*frames)
+            return
+        try:
+            bound = min(last[idx] for idx in (0, 1) if not done[idx])
+        except TypeError as err:
+            sys.exit("ph merge: cannot compare the keys, {}".format(err))
+        below = [_keys_below(frames[idx], keys[idx], bound) for idx in (0, 1)]
+        yield merged(*(frames[idx][below[idx]] for idx in (0, 1)))
+        frames = [frames[idx][~below[idx]] for idx in (0, 1)]
+        for idx in (0, 1):
+            if not done[idx] and last[idx] == bound:
+                _read_next(frames, chunks, fnames, keys, last, done, idx)
+
+
+def _merge_asof(frames, chunks, fnames, kwargs, tolerance):
+    """Merge two inputs sorted on their keys as of, chunk by chunk.
+
+    For each chunk of the first input, the second is read up to a key past
+    the chunk's last key, and the rows that can no longer be matched are
+    dropped: all but the last of each --by group before that key.  Keys
+    that are not numbers are parsed as dates, and written as they were read.
+
+    """
+    import itertools
+
+    keys = [kwargs.get("left_on", kwargs.get("on")), kwargs.get("right_on")]
+    keys[1] = keys[1] if keys[1] is not None else keys[0]
+    by = kwargs.get("by")
+    # the right keys as read, in a column whose label is no column name
+    read = object() if "right_on" in kwargs else None
+
+    def prepare(df, idx, previous):
+        _assert_cols(df, [keys[idx]], "merge")
+        if idx == 1 and read is not None:
+            df = df.copy(deep=False)
+            df[read] = df[keys[1]]
+        if not len(df) or pd.api.types.is_numeric_dtype(df[keys[idx]]):
+            keyed = df
         else:
-            sys.exit("Specify columns in both files.  left was {}, right was {}".format(left, right))
+            try:
+                keyed = df.assign(**{keys[idx]: pd.to_datetime(df[keys[idx]])})
+            except (ValueError, TypeError) as err:
+                sys.exit("ph merge: {} in {} of {}".format(err, keys[idx], fnames[idx]))
+        return keyed, _assert_sorted(keyed, [keys[idx]], previous, fnames[idx])
+
+    def merged(df1, df2):
+        key1, key2 = df1[keys[0]], df2[keys[1]]
+        if pd.api.types.is_numeric_dtype(key1) and pd.api.types.is_numeric_dtype(key2):
+            if key1.dtype != key2.dtype or isinstance(tolerance, float):
+                df1 = df1.assign(**{keys[0]: key1.astype(float)})
+                df2 = df2.assign(**{keys[1]: key2.astype(float)})
+        limit = tolerance
+        if tolerance is not None and not pd.api.types.is_numeric_dtype(key1):
+            try:
+                limit = pd.Timedelta(tolerance)
+            except ValueError as err:
+                sys.exit("--tolerance for dates must be like 10min, {}".format(err))
+        try:
+            return pd.merge_asof(df1, df2, tolerance=limit, **kwargs)
+        except ValueError as err:
+            sys.exit(str(err))
+
+    rows, last = prepare(frames[1], 1, None)
+    done, previous = False, None
+    for chunk in itertools.chain([frames[0]], chunks[0]):
+        keyed, previous = prepare(chunk, 0, previous)
+        while previous is not None and not done and (last is None or last <= previous):
+            more = next(chunks[1], None)
+            if more is None:
+                done = True
+                break
+            more, last = prepare(more, 1, last)
+            rows = pd.concat([rows, more])
+        result = merged(keyed, rows)
+        # as the keys may have been parsed, write the keys as they were
+        result[keys[0]] = chunk[keys[0]].to_numpy()
+        if read is not None:
+            result[keys[1]] = result.pop(read)
+        yield result
+        if previous is not None and len(rows):
+            later = (rows[keys[1]] > previous[0]).to_numpy()
+            earlier = rows[~later]
+            if by is None:
+                earlier = earlier.tail(1)
+            else:
+                earlier = earlier.drop_duplicates(by, keep="last")
+            rows = pd.concat([earlier, rows[later]])
+
+
+def _read_next(frames, chunks, fnames, keys, last, done, idx):
+    """Append the next chunk of input idx to its rows, or mark it done."""
+    chunk = next(chunks[idx], None)
+    if chunk is None:
+        done[idx] = True
+        return
+    _assert_cols(chunk, keys[idx], "merge")
+    last[idx] = _assert_sorted(chunk, keys[idx], last[idx], fnames[idx])
+    frames[idx] = pd.concat([frames[idx], chunk])
+
+
+def _assert_sorted(df, keys, previous, fname):
+    """Exit unless df, following the key tuple previous, is sorted on keys.
+
+    Returns the key tuple of the last row of df, or previous if it is empty.
+
+    """
+    import numpy
+
+    if not len(df):
+        return previous
+    frame = df[keys]
+    if frame.isna().values.any():
+        sys.exit("ph merge: {} has missing values in {}".format(fname, ", ".join(keys)))
+    if previous is not None:
+        frame = pd.concat([pd.DataFrame([previous], columns=keys), frame])
+    greater = numpy.zeros(len(frame) - 1, dtype=bool)
+    equal = numpy.ones(len(frame) - 1, dtype=bool)
+    try:
+        for key in keys:
+            values = frame[key].to_numpy()
+            greater |= equal & (values[:-1] > values[1:])
+            equal &= values[:-1] == values[1:]
+    except TypeError as err:
+        sys.exit("ph merge: cannot compare the keys of {}, {}".format(fname, err))
+    if greater.any():
+        sys.exit("ph merge: {} is not sorted on {}".format(fname, ", ".join(keys)))
+    return tuple(frame[keys].iloc[-1])
+
+
+def _keys_below(df, keys, bound):
+    """Mask of the rows of df whose key tuple is below the tuple bound."""
+    import numpy
+
+    below = numpy.zeros(len(df), dtype=bool)
+    equal = numpy.ones(len(df), dtype=bool)
+    for key, value in zip(keys, bound):
+        values = df[key].to_numpy()
+        below |= equal & (values < value)
+        equal &= values == value
+    return below
 
 
 @register
@@ -1296,8 +4230,9 @@ def _print_commands(cmds):
     num_cols = 72 // max(len(cmd) for cmd in cmds)
     while (len(cmds) % num_cols) != 0:
         cmds.append("")
-    df = pd.DataFrame(pd.Series(cmds).values.reshape(num_cols, -1))
-    print(tabulate_(df.transpose(), showindex=False))
+    num_rows = len(cmds) // num_cols
+    table = [cmds[row::num_rows] for row in range(num_rows)]
+    print(tabulate_(table, showindex=False))
 
 
 @registerx("help")
@@ -1373,9 +4308,12 @@ def slugify():
     Usage: cat a.csv | ph slugify | ph rename less_bad_name good_name
 
     """
-    df = pipein()
-    df.columns = [slugify_name(name) for name in df.columns]
-    pipeout(df)
+
+    def slugify_(df):
+        df.columns = [slugify_name(name) for name in df.columns]
+        return df
+
+    _stream(slugify_)
 
 
 @register
@@ -1384,7 +4322,7 @@ def raw(fname=None):
     import csv
 
     if fname is None:
-        d = csv.reader(sys.stdin)
+        d = csv.reader(_stdin())
         df = pd.DataFrame(d)
     else:
         with open(fname, "r") as fin:
@@ -1457,7 +4395,11 @@ def open_(ftype, fname, **kwargs):
                     errormsg = "Specify --sheet_name"
                 sys.exit(errormsg)
         else:
-            df = reader(fname, **kwargs)
+            df = None
+            if ftype == "csv" and not kwargs and _jobs() > 1:
+                df = _read_csv_jobs(fname)
+            if df is None:
+                df = reader(fname, **kwargs)
     except AttributeError as err:
         sys.exit(
             "{} is not supported in your Pandas installation\n{}".format(ftype, err)
@@ -1494,6 +4436,8 @@ _ATTRS_WITH_SERIES_OUTPUT = (
 
 
 def _call(attr, *args, **kwargs):
+    if not hasattr(pd.DataFrame, attr):
+        sys.exit("Unknown command {}.".format(attr))
     df = pipein()
     dfn = getattr(df, attr)(*args, **kwargs)
     if attr in _ATTRS_WITH_SERIES_OUTPUT:
@@ -1512,6 +4456,30 @@ def register_forward(attr):
     COMMANDS[attr] = partial
 
 
+# The pandas.DataFrame attributes forwarded as commands.  The list is static
+# so that ph can list and dispatch commands without importing pandas;
+# attributes of newer pandas versions are forwarded on demand in _main.
+_FORWARDS = """
+abs add add_prefix add_suffix agg aggregate align all any append apply
+applymap asfreq asof assign at at_time attrs axes backfill between_time
+bfill bool boxplot clip combine combine_first compare convert_dtypes copy
+corr corrwith count cov cummax cummin cumprod cumsum div divide dot
+droplevel duplicated eq equals explode ffill filter first first_valid_index
+flags floordiv from_dict from_records ge get gt hist iat idxmax idxmin iloc
+infer_objects insert interpolate isetitem isin isna isnull items iteritems
+iterrows itertuples join keys kurt kurtosis last last_valid_index le loc
+lookup lt mad mask max mean median melt memory_usage min mod mode mul
+multiply ndim ne nlargest notna notnull nsmallest nunique pad pct_change
+pipe pivot_table pop pow prod product quantile radd rank rdiv reindex
+reindex_like rename_axis reorder_levels resample reset_index rfloordiv rmod
+rmul rpow rsub rtruediv sample select_dtypes sem set_axis set_flags
+set_index shift size skew slice_shift sort_index sort_values sparse squeeze
+stack std style sub subtract sum swapaxes swaplevel take transform transpose
+truediv truncate tshift tz_convert tz_localize unstack update value_counts
+values var where xs
+""".split()
+
+
 @register
 def head(n=10):
     """Similar to `head` but keeps the header.
@@ -1519,12 +4487,21 @@ def head(n=10):
     Print the header followed by the first 10 (or n) lines of the stream to
     standard output.
 
+    Only the first rows are read, and their column types are guessed from
+    these rows alone: a column of 58 that has 58.5 further down is printed
+    as 58, not as 58.0 as with all input (with --engine=pyarrow, from the
+    first block of the input).
+
     Usage: cat a.csv | ph head
            cat a.csv | ph head 8
 
 
     """
-    _call("head", int(n))
+    n = int(n)
+    if n < 0:
+        _call("head", n)
+        return
+    pipeout(_pipein_rows(n))
 
 
 @register
@@ -1534,8 +4511,220 @@ def tail(n=10):
     Print the header followed by the last 10 (or n) lines of the stream to
     standard output.
 
+    Only the last n rows are kept in memory, and a file redirected to
+    standard in is read backwards from its end.  Then the column types are
+    guessed from the last rows alone: a column of 58 that has 58.5 further
+    up is printed as 58, not as 58.0 as with all input.
+
+    Usage: cat a.csv | ph tail
+           ph tail 8 < a.csv
+
+    """
+    n = int(n)
+    if n < 0:
+        _call("tail", n)
+        return
+    df = _tail_file(n)
+    if df is None:
+        df = _tail_chunks(_pipein_chunks(), n)
+    pipeout(df)
+
+
+def _tail_chunks(chunks, n):
+    """Concatenate the last chunks holding (at least) the last n rows."""
+    import collections
+
+    kept = collections.deque()
+    rows = 0
+    for chunk in chunks:
+        kept.append(chunk)
+        rows += len(chunk)
+        while len(kept) > 1 and rows - len(kept[0]) >= n:
+            rows -= len(kept.popleft())
+    return pd.concat(kept).tail(n)
+
+
+def _read_csv_jobs(source, minsize=1 << 24):
+    """Parse the csv file source, a path or a file descriptor, with --jobs.
+
+    The file is split at record boundaries into a byte range per job, and
+    the ranges are parsed, each with the header, in a pool of processes and
+    concatenated in order.  Returns None, to parse the file as usual, for
+    files smaller than minsize and when the parts do not agree on the column
+    types, so the result is always that of one pd.read_csv.
+
+    """
+    import concurrent.futures
+    import multiprocessing
+
+    jobs = _jobs()
+    if jobs < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    if _engine() == "pyarrow":
+        return None  # parses with several threads of its own
+    fd = os.open(source, os.O_RDONLY) if isinstance(source, str) else source
+    try:
+        size = os.fstat(fd).st_size
+        if _pread(fd, len(_SCHEMA_PREFIX), 0) == _SCHEMA_PREFIX:
+            return None  # the header follows the PH_SCHEMA line
+        bounds = _record_bounds(fd, size, jobs) if size >= minsize else None
+        if bounds is None:
+            return None
+        header = _pread(fd, bounds[0], 0)
+        with concurrent.futures.ProcessPoolExecutor(
+            jobs, mp_context=multiprocessing.get_context("fork")
+        ) as pool:
+            parts = list(
+                pool.map(
+                    _parse_range,
+                    [fd] * (len(bounds) - 1),
+                    [header] * (len(bounds) - 1),
+                    bounds[:-1],
+                    bounds[1:],
+                )
+            )
+    finally:
+        if isinstance(source, str):
+            os.close(fd)
+    first = parts[0]
+    for part in parts:
+        if (
+            list(part.columns) != list(first.columns)
+            or list(part.dtypes) != list(first.dtypes)
+            or not isinstance(part.index, pd.RangeIndex)
+        ):
+            return None
+    return pd.concat(parts, ignore_index=True)
+
+
+def _record_bounds(fd, size, jobs, blocksize=1 << 20):
+    """Offsets in the csv file fd that split it into jobs ranges of records.
+
+    The first offset is the end of the header, the last one the size.  The
+    file is scanned for newlines that are not within quotes, up to the last
+    split.  Returns None if the file cannot be split.
+
+    """
+    import numpy
+
+    bounds, targets, quoted, offset = [], [], False, 0
+    while offset < size and (not bounds or targets):
+        block = _pread(fd, min(blocksize, size - offset), offset)
+        data = numpy.frombuffer(block, dtype=numpy.uint8)
+        ends = numpy.flatnonzero(data == ord("\n"))
+        quotes = numpy.flatnonzero(data == ord('"'))
+        if len(quotes):
+            ends = ends[(numpy.searchsorted(quotes, ends) + quoted) % 2 == 0]
+            quoted = (len(quotes) + quoted) % 2 == 1
+        elif quoted:
+            ends = ends[:0]
+        ends = ends + offset + 1
+        if not bounds and len(ends):
+            bounds.append(int(ends[0]))
+            step = (size - bounds[0]) / jobs
+            targets = [bounds[0] + idx * step for idx in range(1, jobs)]
+        while targets:
+            pos = numpy.searchsorted(ends, max(targets[0], bounds[-1] + 1))
+            if pos == len(ends):
+                break
+            bounds.append(int(ends[pos]))
+            targets.pop(0)
+        offset += len(block)
+    bounds = [bound for bound in bounds if bound < size]
+    if len(bounds) < 2 or not _pread(fd, bounds[0], 0).strip():
+        return None
+    return bounds + [size]
+
+
+def _pread(fd, length, offset):
+    """Read length bytes at offset of the file fd."""
+    data = b""
+    while len(data) < length:
+        block = os.pread(fd, length - len(data), offset + len(data))
+        if not block:
+            break
+        data += block
+    return data
+
+
+def _parse_range(fd, header, start, end):
+    """Parse the csv bytes start to end of the file fd, after header."""
+    import io
+
+    return _read_csv(io.BytesIO(header + _pread(fd, end - start, start)))
+
+
+def _stdin_fd():
+    """The file descriptor of standard in if it is a regular file, or None."""
+    import io
+    import stat
+
+    try:
+        fd = sys.stdin.fileno()
+        info = os.fstat(fd)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+    return fd if stat.S_ISREG(info.st_mode) else None
+
+
+def _tail_file(n, blocksize=1 << 16):
+    """Parse the header and the last n lines of standard in, or return None.
+
+    Only applies when standard in is a regular file without quoted fields
+    in the header or the tail, as a newline may be part of a quoted field.
+    The types of the columns are those of the last n lines only.
+
     """
-    _call("tail", int(n))
+    import io
+
+    _read_wire()
+    if _STAGE.input is not None:
+        return None
+    fd = _stdin_fd()
+    if fd is None:
+        return None
+    size = os.fstat(fd).st_size
+
+    header = b""
+    while b"\n" not in header and len(header) < size:
+        header += os.pread(fd, blocksize, len(header))
+    header = header.split(b"\n", 1)[0] + b"\n"
+    if b'"' in header or not header.strip() or header.startswith(_SCHEMA_PREFIX):
+        return None
+
+    # read blocks backwards, counting the lines that each block completes,
+    # until there are more than n; partial is the line that starts before
+    start, blocks, partial, count = size, [], [], 0
+    while start > len(header):
+        offset = max(len(header), start - blocksize)
+        block = os.pread(fd, start - offset, offset)
+        blocks.append(block)
+        start = offset
+        pieces = block.split(b"\n")
+        if len(pieces) > 1:
+            last = pieces[-1] + b"".join(reversed(partial))
+            count += sum(1 for line in pieces[1:-1] if line.strip())
+            count += 1 if last.strip() else 0
+            partial = [pieces[0]]
+        else:
+            partial.append(block)
+        if count > n:
+            break
+    data = b"".join(reversed(blocks))
+    lines = [line for line in data.split(b"\n") if line.strip()]
+    if start > len(header):
+        lines = lines[1:]
+    lines = lines[max(len(lines) - n, 0) :] if n else []
+    if any(b'"' in line for line in lines):
+        return None
+
+    text = (header + b"\n".join(lines)).decode(sys.stdin.encoding or "utf-8")
+    try:
+        return _read_csv(io.StringIO(text.lstrip("\ufeff")))
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+    except pd.errors.ParserError as err:
+        sys.exit(str(err))
 
 
 def __tryparse(x):
@@ -1565,17 +4754,18 @@ def replace(old, new, column=None, newcolumn=None):
     """
     if newcolumn is None:
         newcolumn = column
-    df = pipein()
 
-    if column is None:
-        if newcolumn is not None:
-            sys.exit("Cannot use newcolumn and not column.")
-        df = df.replace(to_replace=old, value=new, inplace=False)
-    elif column not in df:
-        sys.exit("Column {} does not exist.".format(column))
-    else:
+    def replace_(df):
+        if column is None:
+            if newcolumn is not None:
+                sys.exit("Cannot use newcolumn and not column.")
+            return df.replace(to_replace=old, value=new, inplace=False)
+        if column not in df:
+            sys.exit("Column {} does not exist.".format(column))
         df[newcolumn] = df[column].replace(to_replace=old, value=new, inplace=False)
-    pipeout(df)
+        return df
+
+    _stream(replace_, lazy=None if column is None else [column])
 
 
 @register
@@ -1587,7 +4777,7 @@ def rename(before, after):
     Example:  cat a.csv | ph rename x a | ph rename y b
 
     """
-    pipeout(pipein().rename(columns={before: after}))
+    _stream(lambda df: df.rename(columns={before: after}))
 
 
 @register
@@ -1610,6 +4800,10 @@ def columns(*cols, **kwargs):
 
     """
     cols = list(cols)
+    if not cols and not kwargs:
+        print("columns")
+        print("\n".join(_read_header()))
+        return
     df = pipein()
     if "startswith" in kwargs:
         q = kwargs["startswith"]
@@ -1623,12 +4817,7 @@ def columns(*cols, **kwargs):
                 cols.append(col)
 
     _assert_cols(df, cols, "columns")
-
-    if not cols and not kwargs:
-        print("columns")
-        print("\n".join(list(df.columns)))
-    else:
-        pipeout(df[cols])
+    pipeout(df[cols])
 
 
 @register
@@ -1642,26 +4831,106 @@ def spencer(*cols):
     ultimately lose some data on each end of the timeseries.
 
     """
-    _SPENCER = (-3, -6, -5, 3, 21, 46, 67, 74, 67, 46, 21, 3, -5, -6, -3)
-    _SPENCER_SUM = sum(_SPENCER)
+    _smooth(cols, _SPENCER, sum(_SPENCER), trailing=8, caller="spencer")
 
-    def spencer_(lst):
-        for i in range(7, len(lst) - 8):
-            seq = lst[i - 7 : i + 8]
-            yield sum(seq[i] * _SPENCER[i] / _SPENCER_SUM for i in range(15))
 
-    df = pipein()
-    _assert_cols(df, cols, "spencer")
-    prefix = [float("nan")] * 7
-    suffix = [float("nan")] * 8
-    if not cols:
-        cols = list(df.columns)
-    for col in cols:
-        lst = list(df[col])
-        s = list(spencer_(lst))
-        ncol = prefix + s + suffix
-        df[col] = ncol
-    pipeout(df)
+# Spencer's 15-weight average, divided by the sum of the weights, 320.  The
+# last 8 (not 7) rows are left out, as they always have been.
+_SPENCER = (-3, -6, -5, 3, 21, 46, 67, 74, 67, 46, 21, 3, -5, -6, -3)
+
+
+@register
+def smooth(*cols, kernel="henderson", window=None, weights=None):
+    """Smooth columns with a centered, fixed-weight moving average.
+
+    Kernels are spencer (15 weights), henderson (--window, default 13,
+    odd) and hann (--window, default 7), or give the weights with
+    --weights, which are divided by their sum.  The rows at each end
+    without a full window are left out.
+
+    Usage: cat a.csv | ph smooth
+           cat a.csv | ph smooth x --kernel=hann --window=5
+           cat a.csv | ph smooth x y --weights=1,2,1
+
+    """
+    import numpy
+
+    if weights is not None:
+        try:
+            weights = [float(w) for w in str(weights).split(",")]
+        except ValueError:
+            sys.exit(
+                "--weights must be numbers separated by commas, not {}".format(weights)
+            )
+        divisor = sum(weights) or 1
+    elif kernel == "spencer":
+        _smooth(cols, _SPENCER, sum(_SPENCER), trailing=8, caller="smooth")
+        return
+    elif kernel == "henderson":
+        window = 13 if window is None else window
+        if not isinstance(window, int) or window < 3 or window % 2 == 0:
+            sys.exit(
+                "--window must be an odd int >= 3 for henderson, not {}".format(window)
+            )
+        h = (window + 3) // 2
+        j = numpy.arange(-(window // 2), window // 2 + 1, dtype=float)
+        weights = (
+            315
+            * ((h - 1) ** 2 - j**2)
+            * (h**2 - j**2)
+            * ((h + 1) ** 2 - j**2)
+            * (3 * h**2 - 16 - 11 * j**2)
+        ) / (
+            8 * h * (h**2 - 1) * (4 * h**2 - 1) * (4 * h**2 - 9) * (4 * h**2 - 25)
+        )
+        divisor = 1
+    elif kernel == "hann":
+        window = 7 if window is None else window
+        if not isinstance(window, int) or window < 1:
+            sys.exit("--window must be a positive int for hann, not {}".format(window))
+        weights = numpy.hanning(window + 2)[1:-1]
+        divisor = weights.sum()
+    else:
+        sys.exit(
+            "Unknown --kernel={}, should be spencer, henderson or hann".format(kernel)
+        )
+
+    _smooth(cols, weights, divisor, caller="smooth")
+
+
+def _smooth(cols, weights, divisor, trailing=None, caller=None):
+    """Write the weighted moving average of cols, chunk by chunk.
+
+    The weights are centered on each row, and the leading and trailing
+    rows without a full window are N/A.  Each weight is applied to all
+    rows and columns at once.
+
+    """
+    import numpy
+
+    leading = len(weights) // 2
+    if trailing is None:
+        trailing = len(weights) - 1 - leading
+
+    def smooth_(df):
+        _assert_cols(df, cols, caller)
+        columns = list(cols) or list(df.columns)
+        try:
+            values = df[columns].to_numpy(dtype=float)
+        except (TypeError, ValueError):
+            sys.exit("ph {}: can only smooth numeric columns".format(caller))
+        retval = numpy.full(values.shape, numpy.nan)
+        rows = len(values) - leading - trailing
+        if rows > 0:
+            # one weight at a time, in the order of Spencer's original sum
+            acc = 0
+            for i, weight in enumerate(weights):
+                acc = acc + values[i : i + rows] * weight / divisor
+            retval[leading : leading + rows] = acc
+        df[columns] = retval
+        return df
+
+    _stream_context(smooth_, before=leading, after=trailing)
 
 
 def _parse_slice(slicestr):
@@ -1701,10 +4970,14 @@ def slice_(slicestr):
     """
     pattern = ":<int> | <int>: | <int>:<int> | <int>:<int>:<int>"
     error = "Input to slice is {} _not_ {}".format(pattern, slicestr)
-    df = pipein()
     if isinstance(slicestr, int) or ":" not in slicestr:
         sys.exit(error)
     start, end, step = _parse_slice(slicestr)
+    bounded = end is not None and end >= 0 and (start or 0) >= 0
+    if bounded and (step or 1) > 0:
+        df = _pipein_rows(end)
+    else:
+        df = pipein()
     retval = df[start:end:step]
     pipeout(retval)
 
@@ -1749,18 +5022,34 @@ def shape():
 
     The output will have two rows and two columns, with header "rows,columns".
 
+    The rows are counted without parsing them, in constant memory.
+
     """
-    print("rows,columns\n" + ",".join([str(x) for x in pipein().shape]))
+    import csv
+    import io
+
+    _read_wire()
+    if _STAGE.has_frame():
+        shape = pipein().shape
+    else:
+        header, records = _count_records()
+        if header is None:
+            shape = (0, 0)
+        else:
+            header = io.StringIO(header.decode("utf-8", errors="replace"))
+            shape = (records, len(next(csv.reader(header))))
+    print("rows,columns\n" + ",".join([str(x) for x in shape]))
 
 
 @register
 def empty():
     """Print a csv file with one column containing True or False.
 
-    The output depends on whether the csv input was empty.
+    The output depends on whether the csv input was empty.  Only the header
+    and the first row are read.
 
     """
-    print("empty\n{}".format(pipein().empty))
+    print("empty\n{}".format(_pipein_rows(1).empty))
 
 
 @register
@@ -1775,18 +5064,141 @@ def index():
 
 
 @register
-def sort(*col):
+def sort(*col, memory="1G"):
     """Sort csv input by column(s).
 
     This is the only way to sort on multiple columns since sort is not stable.
 
+    Input larger than --memory (default 1G) is sorted in runs that are
+    spilled to temporary files and merged.
+
     Usage: cat iris.csv | ph sort setosa
            cat iris.csv | ph sort setosa verginica
+           cat big.csv | ph sort setosa --memory=200M
 
     """
-    df = pipein()
+    col = list(col)
+    budget = _parse_size(memory, "memory")
+    replay = _Replay()
+    chunks = _pipein_chunks(replay)
+    df = next(chunks)
     _assert_cols(df, col, "sort")
-    pipeout(df.sort_values(list(col)))
+    kept, size = [df], df.memory_usage(deep=True).sum()
+    try:
+        for df in chunks:
+            kept.append(df)
+            size += df.memory_usage(deep=True).sum()
+            if size > budget:
+                # all input is read and spilled before the first row is written
+                _pipeout_chunks(_external_sort(kept, chunks, col, budget))
+                return
+    except _TypesChanged:
+        del kept
+        pipeout(replay.frame().sort_values(col))
+        return
+    df = kept[0] if len(kept) == 1 else _concat_chunks(kept, replay)
+    pipeout(df.sort_values(col))
+
+
+def _parse_size(size, name):
+    """Parse a size in bytes, like 1000, 64K, 200M or 2G."""
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    match = re.match(r"^(\d+(?:\.\d+)?)([KMGT]?)B?$", str(size).upper())
+    if not match:
+        sys.exit("--{} must be a size like 500M or 2G, not {}".format(name, size))
+    return int(float(match.group(1)) * units.get(match.group(2), 1))
+
+
+def _external_sort(kept, chunks, col, budget):
+    """Sort chunks by col, in runs of about budget bytes, and merge the runs.
+
+    Each run is sorted in memory and written to a temporary file as
+    pickled blocks of --chunksize rows.  The runs are merged a block at a
+    time, so memory stays bounded by the budget and one block per run.
+
+    """
+    import itertools
+    import pickle
+    import tempfile
+
+    block = _chunksize()
+    with tempfile.TemporaryDirectory(prefix="ph-sort-") as tmpdir:
+        runs, heads = [], []
+
+        def spill(frames):
+            run = pd.concat(frames, ignore_index=True).sort_values(col)
+            path = os.path.join(tmpdir, "run{}".format(len(runs)))
+            with open(path, "wb") as fout:
+                for start in range(0, len(run), block):
+                    chunk = run.iloc[start : start + block]
+                    pickle.dump(chunk, fout, pickle.HIGHEST_PROTOCOL)
+            runs.append(path)
+            heads.append(run.head(1))
+
+        frames, size = [], 0
+        for df in itertools.chain(kept, chunks):
+            _assert_same_types(df, kept[0])
+            frames.append(df)
+            size += df.memory_usage(deep=True).sum()
+            if size > budget:
+                spill(frames)
+                frames, size = [], 0
+        if frames:
+            spill(frames)
+        del kept, frames
+
+        # every run is written with the dtypes of the whole input
+        dtypes = pd.concat(heads).dtypes
+        blocks = [_read_blocks(path) for path in runs]
+        for merged in _merge_runs(blocks, col):
+            yield merged.astype(dtypes)
+
+
+def _read_blocks(path):
+    """Read the pickled blocks of a sorted run, see _external_sort."""
+    import pickle
+
+    with open(path, "rb") as fin:
+        while True:
+            try:
+                yield pickle.load(fin)
+            except EOFError:
+                return
+
+
+def _merge_runs(runs, col):
+    """Merge the sorted runs (iterators of DataFrames) into sorted blocks.
+
+    The smallest of the last keys read from each run is a bound: no run
+    has unread rows below it, so all buffered rows up to it can be written.
+
+    """
+    import numpy
+
+    buffers = [next(run) for run in runs]
+    active = list(range(len(runs)))
+    while active:
+        bound = pd.concat([buffers[i].tail(1) for i in active])
+        bound = bound.sort_values(col, kind="mergesort").head(1)
+        merged = pd.concat(buffers + [bound], ignore_index=True)
+        order = merged[col].sort_values(col, kind="mergesort").index.to_numpy()
+        # the stable sort puts the bound after all rows with equal keys
+        cut = (order == len(merged) - 1).argmax()
+        yield merged.take(order[:cut])
+
+        written = numpy.zeros(len(merged), dtype=bool)
+        written[order[:cut]] = True
+        start = 0
+        for i, buffer in enumerate(buffers):
+            buffers[i] = buffer[~written[start : start + len(buffer)]]
+            start += len(buffer)
+        for i in list(active):
+            if not len(buffers[i]):
+                buffers[i] = next(runs[i], buffers[i])
+                if not len(buffers[i]):
+                    active.remove(i)
+    rest = pd.concat(buffers, ignore_index=True)
+    yield rest.sort_values(col, kind="mergesort")
 
 
 @register
@@ -1827,11 +5239,243 @@ def __process(attr):
     return True
 
 
-for attr in dir(pd.DataFrame):
+for attr in _FORWARDS:
     if __process(attr):
         register_forward(attr)
 
 
+def _split_pipeline(expr):
+    """Split "cmd args | cmd args | ..." into lists of arguments."""
+    import shlex
+
+    lexer = shlex.shlex(expr, posix=False, punctuation_chars="|")
+    lexer.whitespace_split = True
+    stages = [[]]
+    try:
+        for token in lexer:
+            if token == "|":
+                stages.append([])
+            elif token.startswith("|"):
+                sys.exit("ph pipe: unexpected {} in {}".format(token, expr))
+            else:
+                stages[-1].extend(shlex.split(token))
+    except ValueError as err:
+        sys.exit("ph pipe: {}".format(err))
+    return stages
+
+
+def _run_stage(stage):
+    """Run one stage of `ph pipe`, keeping its output in memory."""
+    import io
+
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    _STAGE.capture = True
+    try:
+        _main(["ph"] + stage)
+    except SystemExit as err:
+        if err.code not in (None, 0):
+            raise
+    finally:
+        printed = sys.stdout.getvalue()
+        sys.stdout = stdout
+        _STAGE.capture = False
+    output, _STAGE.output = _STAGE.output, None
+    # commands that print instead of using pipeout, e.g. ph columns
+    _STAGE.input = printed if output is None else output
+
+
+@register
+def pipe(expr):
+    """Run a pipeline of ph commands in one process.
+
+    The input is read once and the output written once; the stages pass
+    DataFrames in memory instead of writing and parsing csv, so column
+    types (e.g. dates) are kept between stages.
+
+    Usage: cat a.csv | ph pipe "columns x y | eval 'z = x + y' | head 5"
+           cat a.csv | ph pipe "date x --unit=s | sort x | show"
+           cat a.csv | ph pipe "eval 'z = x + y' | sort z" --chunksize=0
+
+    Options given to pipe apply to all stages, those given to a stage only
+    to that stage.
+
+    """
+    stages = _split_pipeline(str(expr))
+    for stage in stages:
+        if not stage:
+            sys.exit("ph pipe: empty command in {}".format(expr))
+        if stage[0] == "pipe":
+            sys.exit("ph pipe: cannot nest pipe")
+    options = dict(OPTIONS)
+    for num, stage in enumerate(stages):
+        OPTIONS.clear()
+        OPTIONS.update(options)
+        if num < len(stages) - 1:
+            _run_stage(stage)
+        else:
+            _main(["ph"] + stage)
+
+
+def _socket_path(path=None):
+    """The Unix socket of `ph serve`: --socket, $PH_SOCKET or a per-user default."""
+    if path is None:
+        path = os.environ.get("PH_SOCKET")
+    if path is None:
+        import tempfile
+
+        rundir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+        path = os.path.join(rundir, "ph-{}.sock".format(os.getuid()))
+    return path
+
+
+def _send_request(conn, request, fds):
+    """Send a length-prefixed json request with file descriptors attached."""
+    import array
+    import json
+    import socket
+    import struct
+
+    body = json.dumps(request).encode("utf-8")
+    data = struct.pack("!I", len(body)) + body
+    ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds))]
+    sent = conn.sendmsg([data], ancillary)
+    conn.sendall(data[sent:])
+
+
+def _recv_request(conn, maxfds=3):
+    """Receive a request sent with _send_request; returns (request, fds)."""
+    import array
+    import json
+    import socket
+    import struct
+
+    fds = array.array("i")
+    data, ancillary, _, _ = conn.recvmsg(65536, socket.CMSG_LEN(maxfds * fds.itemsize))
+    for level, kind, payload in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(payload[: len(payload) - len(payload) % fds.itemsize])
+    while len(data) < 4 or len(data) < 4 + struct.unpack("!I", data[:4])[0]:
+        more = conn.recv(65536)
+        if not more:
+            raise EOFError("Incomplete ph request")
+        data += more
+    return json.loads(data[4:].decode("utf-8")), list(fds)
+
+
+def _exit_status(code):
+    """The process exit status corresponding to sys.exit(code)."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _serve_one(conn):
+    """Run one client request in a forked child and report the exit status."""
+    import io
+    import struct
+
+    status = 1
+    try:
+        request, fds = _recv_request(conn)
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdin = io.open(0, "r", closefd=False)
+        sys.stdout = io.open(1, "w", closefd=False)
+        sys.stderr = io.open(2, "w", closefd=False)
+        os.environ.clear()
+        os.environ.update(request["env"])
+        os.chdir(request["cwd"])
+        try:
+            _main(request["argv"])
+            status = 0
+        except SystemExit as err:
+            status = _exit_status(err.code)
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BaseException:
+        import traceback
+
+        traceback.print_exc()
+    finally:
+        try:
+            conn.sendall(struct.pack("!i", status))
+        finally:
+            os._exit(0)
+
+
+@register
+def serve(socket=None):
+    """Serve ph commands from a warm interpreter on a Unix socket.
+
+    Every ph invocation pays for starting Python and importing pandas.
+    `ph serve` does this once, and the lightweight `ph-client` forwards its
+    arguments, working directory, environment, standard in, out and error
+    to the server, which runs the command in a forked child.  If no server
+    is running, `ph-client` runs the command itself.
+
+    The socket is --socket, $PH_SOCKET or $XDG_RUNTIME_DIR/ph-<uid>.sock.
+
+    Usage: ph serve &
+           cat a.csv | ph-client columns x y | ph-client head 3
+           ph serve --socket=/tmp/ph.sock &
+           PH_SOCKET=/tmp/ph.sock ph-client open csv a.csv
+
+    """
+    import io
+    import signal
+    import socket as socket_
+
+    if not hasattr(socket_, "AF_UNIX") or not hasattr(os, "fork"):
+        sys.exit("ph serve needs Unix sockets and fork")
+    path = _socket_path(socket)
+
+    if os.path.exists(path):
+        probe = socket_.socket(socket_.AF_UNIX, socket_.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            sys.exit("ph serve: already serving on {}".format(path))
+        except OSError:
+            os.unlink(path)  # stale socket of a dead server
+        finally:
+            probe.close()
+
+    # warm up: import pandas and the modules lazily imported by read and write
+    pd.read_csv(io.StringIO("x\n1\n")).to_csv()
+    tabulate_([[1]])
+
+    server = socket_.socket(socket_.AF_UNIX, socket_.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen(128)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # children are not waited for
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print("ph serve: listening on {}".format(path), file=sys.stderr)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        while True:
+            conn, _ = server.accept()
+            if os.fork() == 0:
+                server.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                _serve_one(conn)
+            conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(path)
+
+
 def _main(argv):
     if len(argv) < 2:
         sys.exit("Usage: ph command [args]\n       ph help")
@@ -1842,32 +5486,71 @@ def _main(argv):
     if cmd in ("-h", "--h", "--help"):
         cmd = "help"
     if cmd not in COMMANDS:
-        sys.exit("Unknown command {}.".format(cmd))
+        if not (__process(cmd) and hasattr(pd.DataFrame, cmd)):
+            sys.exit("Unknown command {}.".format(cmd))
+        register_forward(cmd)
 
     # Self-implemented parsing of arguments.
     # Arguments of type "abc" and "--abc" go into args
     # Arguments of type "--abc=def" go into kwargs as key, value pairs
+    # Arguments of type "--opt=val" for global options go into OPTIONS
     args = []
     kwarg = {}
     for a in argv[2:]:
         if KWARG.match(a):
-            args.append(a)
+            if a[2:] in OPTION_DEFAULTS:
+                if not isinstance(OPTION_DEFAULTS[a[2:]], bool):
+                    sys.exit("{} needs a value, as in {}=value".format(a, a))
+                OPTIONS[a[2:]] = True
+            else:
+                args.append(a)
         elif KWARG_WITH_VALUE.match(a):
             split = a.index("=")
             k = a[2:split]
             v = a[split + 1 :]
-            kwarg[k] = __tryparse(v)
+            if k in OPTION_DEFAULTS:
+                OPTIONS[k] = __tryparse(v)
+            else:
+                kwarg[k] = __tryparse(v)
         else:
             args.append(__tryparse(a))
     try:
         COMMANDS[cmd](*args, **kwarg)
     except TypeError as err:
         sys.exit(err)
+    except BrokenPipeError:
+        _broken_pipe()
 
 
 def main():
     _main(sys.argv)
 
 
+def client():
+    """Run a command in `ph serve`, or in this process if no server is up."""
+    import socket
+    import struct
+
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(_socket_path())
+    except OSError:
+        conn.close()
+        main()
+        return
+
+    request = {"argv": sys.argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+    sys.stdout.flush()
+    _send_request(conn, request, [0, 1, 2])
+    data = b""
+    while len(data) < 4:
+        more = conn.recv(4 - len(data))
+        if not more:
+            sys.exit("ph-client: lost connection to ph serve")
+        data += more
+    conn.close()
+    sys.exit(struct.unpack("!i", data)[0])
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,3 @@
+import ph
+
+ph.main()
@@ -73,6 +73,7 @@ setup(
     entry_points={
         "console_scripts": [
             "ph = ph:main",
+            "ph-client = ph:client",
         ],
     },
     test_suite="tests",
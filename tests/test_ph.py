@@ -2,6 +2,8 @@ import ph
 
 import os.path
 import io
+import subprocess
+import sys
 
 import pytest
 import contextlib
@@ -14,6 +16,15 @@ NAN = float("nan")
 LEFT_COLUMNS = ["key1", "key2", "A", "B"]  # columns of left.csv
 
 
+def __have_pyarrow():
+    try:
+        import pyarrow  # noqa
+
+        return True
+    except ImportError:
+        return False
+
+
 def __have_xlrd():
     try:
         import xlrd  # noqa
@@ -92,6 +103,13 @@ def phmgr(capsys, monkeypatch):
     return phmgr
 
 
+@pytest.fixture(autouse=True)
+def options(monkeypatch):
+    # global options set with --option=value must not leak between tests
+    monkeypatch.setattr(ph, "OPTIONS", {})
+    return ph.OPTIONS
+
+
 def _call(cmd, extra=None):
     if extra is None:
         extra = []
@@ -343,6 +361,34 @@ def test_describe(phmgr):
     assert "max" in captured.out
 
 
+def test_describe_chunks(capsys, monkeypatch, options):
+    options["chunksize"] = 7
+    monkeypatch.setattr("sys.stdin", _get_io("iris"))
+    _call("describe")
+    streamed = capsys.readouterr().out
+
+    monkeypatch.setattr("sys.stdin", _get_io("iris"))
+    _call("describe --exact")
+    exact = capsys.readouterr().out
+    df = pd.read_csv(_get_path("iris"))
+    assert exact == str(df.describe()) + "\n"
+    # 150 rows are few enough for the t-digest to be exact
+    assert streamed.split() == exact.split()
+
+
+def test_tdigest():
+    import numpy
+
+    values = numpy.random.default_rng(1).lognormal(size=100000)
+    digest = ph._TDigest(compression=200)
+    for chunk in numpy.array_split(values, 10):
+        digest.update(chunk)
+    assert len(digest.means) < 200
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        estimate = (values < digest.quantile(q)).mean()
+        assert estimate == pytest.approx(q, abs=0.01)
+
+
 def test_shape(phmgr):
     with phmgr("covid") as captured:
         _call("shape")
@@ -352,6 +398,124 @@ def test_shape(phmgr):
     assert list(df["columns"]) == [10]
 
 
+def test_read_csv_jobs(tmp_path, options):
+    options["jobs"] = 3
+    path = str(tmp_path / "quoted.csv")
+    with open(path, "w") as fout:
+        fout.write('x,y\n1,"a\nb"\n2,c\n\n3,"d,""e"""\n4,"\n"\n5,f\n6,g\n')
+    with open(path, "rb") as fin:
+        bounds = ph._record_bounds(fin.fileno(), os.path.getsize(path), 3)
+        assert bounds == [4, 17, 35, 43]
+    df = ph._read_csv_jobs(path, minsize=0)
+    pd.testing.assert_frame_equal(df, pd.read_csv(path))
+
+    # parts that do not agree on the column types are read as a whole
+    with open(path, "w") as fout:
+        fout.write("x\n" + "1\n" * 10 + "a\n" * 10)
+    assert ph._read_csv_jobs(path, minsize=0) is None
+
+    # as is a file that starts with a PH_SCHEMA line
+    with open(path, "w") as fout:
+        fout.write('#ph:schema:{"x":"object"}\nx\n' + "a\n" * 20)
+    assert ph._read_csv_jobs(path, minsize=0) is None
+
+
+@pytest.mark.parametrize(
+    "engine",
+    [
+        "c",
+        "python",
+        pytest.param(
+            "pyarrow",
+            marks=pytest.mark.skipif(not __have_pyarrow(), reason="missing pyarrow"),
+        ),
+    ],
+)
+def test_engine(engine, capsys, monkeypatch, options):
+    options["engine"] = engine
+    data = 'x,y,z\n1.5,"a\nb",2020-03-01\n,,2020-03-02\n'
+    monkeypatch.setattr("sys.stdin", io.StringIO(data))
+    _call("cat")
+    assert capsys.readouterr().out == data
+
+    _call("cat {} {}".format(_get_path("a"), _get_path("broken")))
+    expected = pd.concat([pd.read_csv(_get_path("a")), pd.read_csv(_get_path("broken"))])
+    actual = pd.read_csv(io.StringIO(capsys.readouterr().out))
+    pd.testing.assert_frame_equal(actual, expected.reset_index(drop=True))
+
+
+@pytest.mark.skipif(not __have_pyarrow(), reason="missing pyarrow")
+def test_engine_pyarrow_chunks(capsys, monkeypatch, options):
+    options["engine"] = "pyarrow"
+    # the first block of the input has ints, the last one a float
+    data = "x,y,z\n" + "".join("{},b,\n".format(i) for i in range(1 << 17))
+    data += "1.5,,c\n"
+    expected = pd.read_csv(io.StringIO(data))
+    for chunksize in (0, 1000):
+        options["chunksize"] = chunksize
+        monkeypatch.setattr("sys.stdin", io.StringIO(data))
+        _call("sort x")
+        actual = pd.read_csv(io.StringIO(capsys.readouterr().out))
+        pd.testing.assert_frame_equal(
+            actual, expected.sort_values("x").reset_index(drop=True)
+        )
+
+    # the chunks cannot go on past the float, the input is read again
+    monkeypatch.setattr("sys.stdin", io.StringIO(data))
+    with pytest.raises(ph._TypesChanged):
+        list(ph._read_csv(sys.stdin, chunksize=1000))
+
+    # missing text is NaN and empty columns are floats, as with pandas
+    data = "x,y,z\n1,a,\n2,,\n"
+    monkeypatch.setattr("sys.stdin", io.StringIO(data))
+    chunks = list(ph._read_csv(sys.stdin, chunksize=1))
+    assert [len(chunk) for chunk in chunks] == [1, 1]
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks), pd.read_csv(io.StringIO(data), engine="c")
+    )
+
+
+def test_engine_unknown(monkeypatch):
+    monkeypatch.setenv("PH_ENGINE", "fast")
+    with pytest.raises(SystemExit) as exit_:
+        _call("cat")
+    assert str(exit_.value) == "--engine must be one of c, python or pyarrow, not fast"
+
+
+def test_shape_scan(capsys, monkeypatch):
+    data = 'x,"y\nz"\n\n1,"a\n\nb"\r\n  \n2,""""\n3,4'
+    expected = pd.read_csv(io.StringIO(data)).shape
+    monkeypatch.setattr("sys.stdin", io.StringIO(data))
+    _call("shape")
+    assert capsys.readouterr().out == "rows,columns\n{},{}\n".format(*expected)
+    for blocksize in (1, 2, 5):
+        monkeypatch.setattr("sys.stdin", io.StringIO(data))
+        assert ph._count_records(blocksize) == (b'x,"y\nz"\n', expected[0])
+
+    for data, shape in (("", "0,0"), ("\n\n", "0,0"), ("x,y,z\n", "0,3")):
+        monkeypatch.setattr("sys.stdin", io.StringIO(data))
+        _call("shape")
+        assert capsys.readouterr().out == "rows,columns\n{}\n".format(shape)
+
+
+def test_empty(capsys, monkeypatch):
+    for data, expected in (("x,y\n3,8\n4,9\n", False), ("x,y\n", True), ("", True)):
+        monkeypatch.setattr("sys.stdin", io.StringIO(data))
+        _call("empty")
+        assert capsys.readouterr().out == "empty\n{}\n".format(expected)
+
+
+def test_dtypes_sample(phmgr):
+    with phmgr("covid") as captured:
+        _call("dtypes --sample=5")
+    # the missing values of all but China come further down
+    assert captured.out.splitlines()[1] == ",".join(["int64"] * 10)
+
+    with pytest.raises(SystemExit) as exit_:
+        _call("dtypes --sample=0")
+    assert str(exit_.value) == "--sample must be a positive int, not 0"
+
+
 def test_transpose(phmgr):
     with phmgr() as captured:
         _call("transpose")
@@ -386,6 +550,57 @@ x,y
     assert not captured.err
 
 
+@pytest.mark.parametrize("cmd", ["head 2", "slice :2", "slice 1:2"])
+def test_head_stops_reading(cmd, capsys, monkeypatch):
+    # the malformed rows are never parsed when head stops early
+    data = "x,y\n3,8\n4,9\n" + "5,10,11\n" * 100000
+    monkeypatch.setattr("sys.stdin", io.StringIO(data))
+    _call(cmd)
+    captured = capsys.readouterr()
+    assert not captured.err
+    assert captured.out.endswith("4,9\n")
+    assert sys.stdin.tell() < len(data)
+
+
+@pytest.mark.parametrize("chunksize", [0, 1, 4])
+def test_tail_chunks(chunksize, capsys, monkeypatch, options):
+    options["chunksize"] = chunksize
+    monkeypatch.setattr("sys.stdin", _get_io("left"))
+    _call("tail 5")
+    streamed = capsys.readouterr().out
+    df = pd.read_csv(_get_path("left"))
+    assert streamed == df.tail(5).to_csv(index=False)
+
+
+@pytest.mark.parametrize("name", ["a", "d", "left", "padded_decimals"])
+@pytest.mark.parametrize("n", [0, 2, 100])
+def test_tail_file(name, n, capsys, monkeypatch):
+    with open(_get_path(name)) as fin:
+        monkeypatch.setattr("sys.stdin", fin)
+        _call("tail {}".format(n))
+    captured = capsys.readouterr()
+    assert not captured.err
+    df = pd.read_csv(_get_path(name))
+    assert captured.out == df.tail(n).to_csv(index=False)
+
+
+def test_tail_file_blocks(tmp_path, monkeypatch):
+    # lines longer than the blocks, and blank lines between them
+    data = "x,y\n1,abcdefg\n\n2,b\n  \n33333,cc\n4,d"
+    path = tmp_path / "tail.csv"
+    path.write_text(data)
+    expected = pd.read_csv(io.StringIO(data))
+    for blocksize in (1, 2, 3, 7, 100):
+        for n in (0, 1, 2, 3, 5):
+            with open(path) as fin:
+                monkeypatch.setattr("sys.stdin", fin)
+                df = ph._tail_file(n, blocksize=blocksize)
+            if n:
+                pd.testing.assert_frame_equal(df, expected.tail(n).reset_index(drop=True))
+            else:
+                assert len(df) == 0 and list(df.columns) == ["x", "y"]
+
+
 def test_open_with_decimals(phmgr):
     with phmgr("padded_decimals") as captured:
         _call("from csv --decimal=, --thousands=.")
@@ -603,6 +818,150 @@ def test_merge(capsys):
     ]
 
 
+@pytest.mark.parametrize("how", ["inner", "left", "right", "outer"])
+def test_merge_stdin(how, capsys, monkeypatch, options):
+    options["chunksize"] = 1
+    lft = pd.read_csv(_get_path("left"))
+    rht = pd.read_csv(_get_path("right"))
+    expected = pd.merge(lft, rht, how=how, on="key1")
+
+    monkeypatch.setattr("sys.stdin", _get_io("left"))
+    _call("merge - {} --how={} --on=key1".format(_get_path("right"), how))
+    actual = pd.read_csv(io.StringIO(capsys.readouterr().out))
+    pd.testing.assert_frame_equal(actual, expected)
+
+    monkeypatch.setattr("sys.stdin", _get_io("right"))
+    _call("merge {} - --how={} --on=key1".format(_get_path("left"), how))
+    actual = pd.read_csv(io.StringIO(capsys.readouterr().out))
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+@pytest.mark.parametrize("how", ["inner", "left", "right", "outer"])
+def test_merge_stdin_order(how, capsys, monkeypatch, tmp_path, options):
+    # Repeated keys in another order in each file, and a row without match
+    lft = tmp_path / "lft.csv"
+    lft.write_text("k,a\n1,x\n2,y\n1,z\n3,w\n")
+    rht = tmp_path / "rht.csv"
+    rht.write_text("k,b\n2,10\n1,11\n4,13\n2,12\n")
+    for args, stdin in (("- {}", lft), ("{} -", rht)):
+        cmd = "merge " + args.format(lft if stdin == rht else rht) + " --how=" + how
+        options["chunksize"] = 0
+        _call("merge {} {} --how={}".format(lft, rht, how))
+        expected = capsys.readouterr().out
+        options["chunksize"] = 1
+        monkeypatch.setattr("sys.stdin", io.StringIO(stdin.read_text()))
+        _call(cmd)
+        assert capsys.readouterr().out == expected
+
+
+def test_merge_inner_order(capsys, monkeypatch, tmp_path, options):
+    # the rows are in the order of standard in, not grouped by key
+    options["chunksize"] = 1
+    rht = tmp_path / "rht.csv"
+    rht.write_text("k,b\n2,10\n1,11\n4,13\n2,12\n")
+    monkeypatch.setattr("sys.stdin", io.StringIO("k,a\n1,x\n2,y\n1,z\n3,w\n"))
+    _call("merge - {} --how=inner".format(rht))
+    assert capsys.readouterr().out == "k,a,b\n1,x,11\n2,y,10\n2,y,12\n1,z,11\n"
+
+
+@pytest.mark.parametrize("how", ["inner", "left", "right", "outer"])
+@pytest.mark.parametrize("on", [None, "key1"])
+def test_merge_sorted(how, on, capsys, options):
+    options["chunksize"] = 1
+    lft = pd.read_csv(_get_path("left"))
+    rht = pd.read_csv(_get_path("right"))
+    expected = pd.merge(lft, rht, how=how, on=on, sort=True)
+    cmd = "merge {} {} --sorted --how={}".format(
+        _get_path("left"), _get_path("right"), how
+    )
+    _call(cmd if on is None else cmd + " --on=" + on)
+    assert capsys.readouterr().out == expected.to_csv(index=False)
+
+
+@pytest.mark.parametrize("how", ["inner", "left", "right", "outer"])
+def test_merge_sorted_types(how, capsys, tmp_path, options):
+    # int columns get missing values only in some of the chunks
+    options["chunksize"] = 2
+    lft = tmp_path / "lft.csv"
+    lft.write_text("k,a\n1,10\n2,20\n3,30\n5,50\n6,60\n")
+    rht = tmp_path / "rht.csv"
+    rht.write_text("k,b\n1,11\n2,21\n4,41\n5,51\n6,61\n")
+    expected = pd.merge(
+        pd.read_csv(str(lft)), pd.read_csv(str(rht)), how=how, sort=True
+    )
+    _call("merge {} {} --sorted --how={}".format(lft, rht, how))
+    assert capsys.readouterr().out == expected.to_csv(index=False)
+
+
+def test_merge_sorted_unsorted(monkeypatch, options):
+    options["chunksize"] = 2
+    monkeypatch.setattr("sys.stdin", io.StringIO("key1,x\nK0,1\nK2,2\nK1,3\n"))
+    with pytest.raises(SystemExit) as exit_:
+        _call("merge - {} --on=key1 --sorted".format(_get_path("right")))
+    assert str(exit_.value) == "ph merge: standard in is not sorted on key1"
+
+
+@pytest.mark.parametrize(
+    "args", ["--on=time", "--on=time --by=sensor", "--on=time --tolerance=2"]
+)
+def test_merge_asof(args, capsys, monkeypatch, tmp_path, options):
+    options["chunksize"] = 2
+    readings = "time,sensor,value\n1,a,10\n2,b,11\n4,a,12\n4,b,13\n7,a,14\n9,b,15\n"
+    calibrations = "time,sensor,offset\n0,a,1\n2,a,2\n3,b,3\n6,b,4\n"
+    with open(str(tmp_path / "cal.csv"), "w") as fout:
+        fout.write(calibrations)
+    monkeypatch.setattr("sys.stdin", io.StringIO(readings))
+    _call("merge - {} --asof {}".format(tmp_path / "cal.csv", args))
+    actual = pd.read_csv(io.StringIO(capsys.readouterr().out))
+    kwargs = dict(arg[2:].split("=") for arg in args.split())
+    kwargs.update(tolerance=int(kwargs.get("tolerance", 0)) or None)
+    expected = pd.merge_asof(
+        pd.read_csv(io.StringIO(readings)),
+        pd.read_csv(io.StringIO(calibrations)),
+        **kwargs
+    )
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_merge_asof_dates(capsys, monkeypatch, tmp_path, options):
+    options["chunksize"] = 1
+    with open(str(tmp_path / "cal.csv"), "w") as fout:
+        fout.write("at,offset\n2020-03-01T10:00,1\n2020-03-01T10:30,2\n")
+    data = "time,value\n2020-03-01T10:10,5\n2020-03-01T10:45,6\n2020-03-01T11:00,7\n"
+    monkeypatch.setattr("sys.stdin", io.StringIO(data))
+    _call(
+        "merge - {} --asof --left=time --right=at --tolerance=20min".format(
+            tmp_path / "cal.csv"
+        )
+    )
+    assert capsys.readouterr().out == (
+        "time,value,at,offset\n"
+        "2020-03-01T10:10,5,2020-03-01T10:00,1.0\n"
+        "2020-03-01T10:45,6,2020-03-01T10:30,2.0\n"
+        "2020-03-01T11:00,7,,\n"
+    )
+
+
+def test_merge_asof_types(capsys, monkeypatch, tmp_path, options):
+    # only the last reading has no calibration within the tolerance
+    cal = tmp_path / "cal.csv"
+    cal.write_text("time,offset\n0,1\n2,2\n")
+    outputs = []
+    for chunksize in (0, 1):
+        options["chunksize"] = chunksize
+        monkeypatch.setattr("sys.stdin", io.StringIO("time,value\n1,10\n2,11\n9,12\n"))
+        _call("merge - {} --asof --on=time --tolerance=2".format(cal))
+        outputs.append(capsys.readouterr().out)
+    assert outputs[0] == outputs[1] == "time,value,offset\n1,10,1.0\n2,11,2.0\n9,12,\n"
+
+
+def test_merge_asof_how(monkeypatch, options):
+    monkeypatch.setattr("sys.stdin", _get_io("left"))
+    with pytest.raises(SystemExit) as exit_:
+        _call("merge - {} --asof --on=key1 --how=inner".format(_get_path("right")))
+    assert "--how" in str(exit_.value)
+
+
 def test_groupby_sum_default(phmgr):
     with phmgr("group") as captured:
         _call("groupby Animal")
@@ -643,6 +1002,234 @@ def test_groupby_first(phmgr):
     assert list(df.iloc[1]) == ["Parrot", 24.0]
 
 
+@pytest.mark.parametrize(
+    "how", ["sum", "prod", "count", "min", "max", "first", "last", "mean", "var", "std"]
+)
+def test_groupby_chunks(how, capsys, monkeypatch, options):
+    options["chunksize"] = 7
+    monkeypatch.setattr("sys.stdin", _get_io("iris"))
+    _call("groupby virginica --how={}".format(how))
+    captured = capsys.readouterr()
+    df = pd.read_csv(_get_path("iris"))
+    expected = getattr(df.groupby("virginica", as_index=False), how)()
+    actual = pd.read_csv(io.StringIO(captured.out))
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("how", ["sum", "prod", "mean", "var", "std", "max"])
+def test_groupby_chunks_floats(how, capsys, monkeypatch, options):
+    # the output is the same as when all input is read at once
+    data = "k,x,n\n" + "".join(
+        "{},{},{}\n".format(i % 3, (i * 7919 % 1000) / 1000 + 0.111, i)
+        for i in range(200)
+    )
+    outputs = []
+    for chunksize in (0, 37):
+        options["chunksize"] = chunksize
+        monkeypatch.setattr("sys.stdin", io.StringIO(data))
+        _call("groupby k --how={}".format(how))
+        outputs.append(capsys.readouterr().out)
+    assert outputs[0] == outputs[1]
+
+
+@pytest.mark.parametrize(
+    "how, expected",
+    [
+        ("sum", "k,x\na,1.0\nb,inf\nc,300000003.0\n"),
+        ("mean", "k,x\na,0.3333333333333333\nb,inf\nc,100000001.0\n"),
+        ("var", "k,x\na,1e+32\nb,\nc,1.0\n"),
+    ],
+)
+def test_groupby_exact(how, expected, capsys, monkeypatch, options):
+    data = "k,x\na,1e16\na,1\na,-1e16\nb,inf\nb,1\nc,1e8\nc,100000001\nc,100000002\n"
+    for chunksize in (0, 1):
+        options["chunksize"] = chunksize
+        monkeypatch.setattr("sys.stdin", io.StringIO(data))
+        _call("groupby k --how={}".format(how))
+        assert capsys.readouterr().out == expected
+
+
+@pytest.mark.parametrize(
+    "cmd",
+    [
+        "groupby k --how=max",
+        "groupby k --how=count",
+        "sort x",
+        "sort x --memory=1",
+        "describe",
+        "drop_duplicates x",
+        "drop_duplicates x --keep=last",
+        "expanding --how=max",
+        "ewm --adjust=False --span=2",
+        "rolling 2 --how=max",
+    ],
+)
+def test_chunks_type_change(capsys, monkeypatch, options, cmd):
+    # a column that is numeric in the first chunks only is read all at once
+    data = "k,x\n1,2\n1,3.5\n2,02\n2,a\n1,2\n"
+    outputs = []
+    for chunksize in (0, 2):
+        options["chunksize"] = chunksize
+        monkeypatch.setattr("sys.stdin", io.StringIO(data))
+        try:
+            _call(cmd)
+            status = None
+        except SystemExit as err:
+            status = str(err)
+        outputs.append((status, capsys.readouterr().out))
+    assert outputs[0] == outputs[1]
+
+
+def test_chunks_type_change_file(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_text("x\n" + "".join("{}\n".format(i) for i in range(9, 0, -1)) + "a\n")
+    with open(str(path)) as fin:
+        proc = _ph_process("sort x --chunksize=3", None, stdin=fin, stdout=subprocess.PIPE)
+        out, _ = proc.communicate()
+    assert out.decode() == "x\n1\n2\n3\n4\n5\n6\n7\n8\n9\na\n"
+
+
+@pytest.mark.parametrize(
+    "cmd",
+    [
+        "query y>5",
+        "eval z=y*2",
+        "round y",
+        "appendstr y _",
+        "grep 7",
+        "fillna 0",
+        "drop_duplicates y",
+        "drop_duplicates y --approx=1K",
+    ],
+)
+@pytest.mark.parametrize("late", ["", "a"])
+def test_stream_types(capsys, monkeypatch, options, cmd, late):
+    # y is int in the first chunks, and float or text in the last one
+    rows = ["{},{}".format(i, i % 10) for i in range(30)]
+    rows[25] = "25," + late
+    data = "x,y\n" + "\n".join(rows) + "\n"
+    outputs = []
+    for chunksize in (0, 7):
+        options["chunksize"] = chunksize
+        monkeypatch.setattr("sys.stdin", io.StringIO(data))
+        try:
+            _call(cmd)
+            status = None
+        except (SystemExit, TypeError) as err:
+            status = str(err)
+        outputs.append((status, capsys.readouterr().out))
+    assert outputs[0] == outputs[1]
+
+
+def test_stream_types_file(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_text("k,x\n" + "".join("a,{}\n".format(i) for i in range(9)) + "b,\n")
+    with open(str(path)) as fin:
+        proc = _ph_process("query x>6 --chunksize=3", None, stdin=fin, stdout=subprocess.PIPE)
+        out, _ = proc.communicate()
+    assert out.decode() == "k,x\na,7.0\na,8.0\n"
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        "",
+        "virginica",
+        "setosa versicolor",
+        "setosa --keep=last",
+        "--keep=False",
+        "--approx=1K",
+    ],
+)
+def test_drop_duplicates(args, capsys, monkeypatch, options):
+    options["chunksize"] = 7
+    monkeypatch.setattr("sys.stdin", _get_io("iris"))
+    _call("drop_duplicates {}".format(args).strip())
+    df = pd.read_csv(_get_path("iris"))
+    cols = [arg for arg in args.split() if not arg.startswith("--")] or None
+    keep = "last" if "last" in args else "False" not in args and "first"
+    expected = df.drop_duplicates(cols, keep=keep).reset_index(drop=True)
+    actual = pd.read_csv(io.StringIO(capsys.readouterr().out))
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_drop_duplicates_numbers(capsys, monkeypatch, options):
+    # 3 is int64 in the first chunk and float64 in the second
+    options["chunksize"] = 2
+    data = "x,y\n3,a\n2,a\n3.0,a\n,a\n2.5,a\n,a\n"
+    monkeypatch.setattr("sys.stdin", io.StringIO(data))
+    _call("drop_duplicates")
+    # as with --chunksize=0, x is float
+    assert capsys.readouterr().out == "x,y\n3.0,a\n2.0,a\n,a\n2.5,a\n"
+
+
+def test_hash_set():
+    import numpy
+
+    seen = ph._HashSet(size=4)
+    # 0 and 1 are different hashes, and 0 is not an empty slot
+    assert list(seen.add(numpy.array([1, 5], dtype=numpy.uint64))) == [True, True]
+    assert list(seen.add(numpy.array([0], dtype=numpy.uint64))) == [True]
+    hashes = numpy.array([1, 0, 9] + list(range(10, 20)), dtype=numpy.uint64)
+    assert list(seen.add(hashes)) == [False, False] + [True] * 11
+    assert list(seen.add(numpy.array([0], dtype=numpy.uint64))) == [False]
+
+
+@pytest.mark.parametrize(
+    "cmd",
+    [
+        "diff --periods=3",
+        "diff cases deaths --periods=-2",
+        "fillna --method=ffill",
+        "fillna --method=bfill",
+        "fillna --method=bfill --limit=2",
+        "fillna 0 --limit=3",
+        "rolling 4",
+        "rolling 5 day --how=mean",
+        "rolling 3 deaths --how=median",
+        "expanding 2 --how=mean",
+        "expanding --how=max",
+        "ewm --alpha=0.3 --adjust=False",
+        "ewm --span=4 --adjust=False --min_periods=5",
+    ],
+)
+def test_stream_context(cmd, capsys, monkeypatch, options):
+    # runs of three N/A values, which cross the chunk boundaries
+    df = pd.read_csv(_get_path("usa"))[["day", "cases", "deaths"]]
+    df.loc[df.index % 7 > 3, ["cases", "deaths"]] = None
+    data = df.to_csv(index=False)
+    outputs = []
+    for chunksize in (0, 1, 4):
+        options["chunksize"] = chunksize
+        monkeypatch.setattr("sys.stdin", io.StringIO(data))
+        _call(cmd)
+        outputs.append(capsys.readouterr().out)
+    assert outputs[0] == outputs[1] == outputs[2]
+
+
+@pytest.mark.parametrize(
+    "cmd",
+    [
+        "fillna 0",
+        "fillna --method=ffill",
+        "fillna --method=bfill",
+        "diff",
+        "rolling 2 --how=max",
+        "expanding --how=max",
+    ],
+)
+def test_stream_context_types(cmd, capsys, monkeypatch, options):
+    # x is int in all chunks but the last, which has a missing value
+    data = "x,y\n" + "".join("{},{}\n".format(i, i % 3) for i in range(10)) + ",1\n"
+    outputs = []
+    for chunksize in (0, 3):
+        options["chunksize"] = chunksize
+        monkeypatch.setattr("sys.stdin", io.StringIO(data))
+        _call(cmd)
+        outputs.append(capsys.readouterr().out)
+    assert outputs[0] == outputs[1]
+
+
 def test_rolling_default(phmgr):
     with phmgr("iris") as captured:
         _call("rolling 3")
@@ -709,6 +1296,62 @@ def test_expanding_quantile(phmgr):
     assert captured.df["setosa"].dropna().sum() == pytest.approx(563.81)
 
 
+def test_pipe(phmgr):
+    with phmgr() as captured:
+        _call("pipe", ["columns y x | eval 'z = x + y' | head 3"])
+    assert not captured.err
+    assert captured.out == "y,x,z\n8,3,11\n9,4,13\n10,5,15\n"
+
+    with phmgr() as captured:
+        _call("pipe", ["head 7 | tail 3"])
+    assert captured.out == "x,y\n6,11\n7,12\n8,13\n"
+
+
+def test_pipe_keeps_dtypes(phmgr):
+    with phmgr("usa") as captured:
+        _call("pipe", ["date dateRep --dayfirst=True | dtypes"])
+    assert not captured.err
+    assert captured.out.splitlines()[1].startswith("datetime64[ns],int64")
+
+
+def test_pipe_printing_stage(phmgr):
+    with phmgr("iris") as captured:
+        _call("pipe", ["columns | head 2 | transpose"])
+    assert not captured.err
+    assert captured.out == "0,1\n150,4\n"
+
+
+def test_pipe_quoted_bar(phmgr):
+    with phmgr("left") as captured:
+        _call("pipe", ['grep "K0|K1" --column=key1 | shape'])
+    assert captured.out == "rows,columns\n3,4\n"
+
+
+def test_pipe_options(phmgr):
+    # options of a stage do not leak into later stages
+    with phmgr() as captured:
+        _call("pipe", ["head 2 --float-format=%.1f | eval z=x/3"])
+    assert captured.out == "x,y,z\n3,8,1.0\n4,9,1.3333333333333333\n"
+
+    with phmgr() as captured:
+        _call("pipe", ["head 2 | eval z=x/3", "--float-format=%.1f"])
+    assert captured.out == "x,y,z\n3,8,1.0\n4,9,1.3\n"
+
+    with pytest.raises(SystemExit) as exit_:
+        _call("head 2 --chunksize")
+    assert str(exit_.value) == "--chunksize needs a value, as in --chunksize=value"
+
+
+def test_pipe_errors(phmgr):
+    with pytest.raises(SystemExit) as exit_:
+        _call("pipe", ["head 2 | | tail"])
+    assert str(exit_.value).startswith("ph pipe: empty command")
+
+    with pytest.raises(SystemExit) as exit_:
+        _call("pipe", ["head 2 | pipe tail"])
+    assert str(exit_.value) == "ph pipe: cannot nest pipe"
+
+
 def test_index(phmgr):
     with phmgr("a") as captured:
         _call("index")
@@ -779,6 +1422,30 @@ def test_sort(phmgr):
     assert lst == sorted(lst)
 
 
+@pytest.mark.parametrize("col", ["setosa", "virginica setosa"])
+def test_sort_external(col, capsys, monkeypatch, options):
+    options["chunksize"] = 10
+    monkeypatch.setattr("sys.stdin", _get_io("iris"))
+    _call("sort {} --memory=1K".format(col))
+    captured = capsys.readouterr()
+    assert not captured.err
+    df = pd.read_csv(io.StringIO(captured.out))
+    expected = pd.read_csv(_get_path("iris")).sort_values(col.split())
+    columns = col.split()
+    assert df[columns].values.tolist() == expected[columns].values.tolist()
+    assert sorted(df.values.tolist()) == sorted(expected.values.tolist())
+
+
+def test_sort_memory_size():
+    assert ph._parse_size("1000", "memory") == 1000
+    assert ph._parse_size(64, "memory") == 64
+    assert ph._parse_size("200M", "memory") == 200 << 20
+    assert ph._parse_size("1.5g", "memory") == 3 << 29
+    with pytest.raises(SystemExit) as exit_:
+        ph._parse_size("lots", "memory")
+    assert str(exit_.value) == "--memory must be a size like 500M or 2G, not lots"
+
+
 def test_grep_case_1(phmgr):
     with phmgr("left") as captured:
         _call("grep k0")
@@ -847,6 +1514,132 @@ def test_grep_col1_pattern_regex_off(phmgr):
     captured.assert_columns(LEFT_COLUMNS)
 
 
+@pytest.mark.parametrize(
+    "cmd",
+    [
+        "grep K0 --column=key1",
+        "grep nomatch",
+        "query A=='A1'",
+        "appendstr A _x",
+        "strip",
+        "removeprefix A A",
+        "replace K0 K9",
+        "rename A a",
+        "slugify",
+        "split key1 0",
+    ],
+)
+def test_streaming_chunks(phmgr, monkeypatch, cmd):
+    with phmgr("left") as captured:
+        _call(cmd)
+    whole = captured.out
+    monkeypatch.setenv("PH_CHUNKSIZE", "1")
+    with phmgr("left") as captured:
+        _call(cmd)
+    assert captured.out == whole
+
+
+def test_chunksize_option(phmgr, options):
+    with phmgr() as captured:
+        _call("eval", ["z = x * y", "--chunksize=4"])
+    assert options == {"chunksize": 4}
+    assert captured.out.splitlines()[1:] == [
+        "3,8,24",
+        "4,9,36",
+        "5,10,50",
+        "6,11,66",
+        "7,12,84",
+        "8,13,104",
+    ]
+
+    with pytest.raises(SystemExit) as exit_:
+        _call("round x --chunksize=-1")
+    assert str(exit_.value) == "--chunksize must be a non-negative int, not -1"
+
+
+def test_pipeout_chunks(capsys, monkeypatch):
+    df = pd.DataFrame({"a": [1, None, 3, None, None], "b": list("vwxyz")})
+    monkeypatch.setenv("PH_CHUNKSIZE", "2")
+    ph.pipeout(df)
+    assert capsys.readouterr().out == df.to_csv(index=False)
+    ph.pipeout(df[["a"]], header=False)
+    assert capsys.readouterr().out == '1.0\n""\n3.0\n""\n""\n'
+    ph.pipeout(df.iloc[:0])
+    assert capsys.readouterr().out == "a,b\n"
+
+
+def test_compact(capsys, monkeypatch):
+    df = ph._compact_frame(pd.read_csv(_get_io("covid")))
+    assert str(df["China"].dtype) == "int32"
+    assert str(df["Italy"].dtype) == "float32"
+    assert str(df["Canada"].dtype) == "Sparse[float32, nan]"
+    expected = pd.read_csv(_get_io("covid")).to_csv(index=False)
+    assert df.to_csv(index=False) == expected
+
+    df = pd.DataFrame({"x": list("abab"), "y": list("abcd"), "z": [0.1, 1, 2, 3]})
+    compact = ph._compact_frame(df)
+    assert list(compact.dtypes.astype(str)) == ["category", "object", "float64"]
+    assert compact.to_csv(index=False) == df.to_csv(index=False)
+
+    monkeypatch.setattr("sys.stdin", _get_io("covid"))
+    _call("info --compact")
+    assert "x smaller)" in capsys.readouterr().out.splitlines()[-1]
+
+    monkeypatch.setattr("sys.stdin", _get_io("covid"))
+    with pytest.raises(SystemExit) as exit_:
+        _call("info --small")
+    assert str(exit_.value) == "Unknown argument to info: --small"
+
+
+def test_groupby_categories(capsys, monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("g,h,x\na,p,1\nb,q,2\n"))
+    _call("pipe", ["astype category g | astype category h | groupby g h --how=sum"])
+    assert capsys.readouterr().out == "g,h,x\na,p,1\nb,q,2\n"
+
+
+def test_float_format(capsys, monkeypatch, options):
+    df = pd.DataFrame({"a": [0.1, None, 1 / 3], "b": [1, 2, 3], "c": [True] * 3})
+    ph.pipeout(df)
+    assert capsys.readouterr().out == df.to_csv(index=False)
+    monkeypatch.setenv("PH_FLOAT_FORMAT", "%.3f")
+    ph.pipeout(df)
+    assert capsys.readouterr().out == "a,b,c\n0.100,1,True\n,2,True\n0.333,3,True\n"
+    ph.pipeout(df.assign(d="x"), sep="\t")
+    assert capsys.readouterr().out == df.assign(d="x").to_csv(
+        index=False, sep="\t", float_format="%.3f"
+    )
+
+    monkeypatch.setattr("sys.stdin", io.StringIO("x,y\n1.25,2\n"))
+    _call("to tsv --float-format=%g")
+    assert capsys.readouterr().out == "x\ty\n1.25\t2\n\n"
+
+    options.clear()
+    monkeypatch.setenv("PH_FLOAT_FORMAT", "%q")
+    with pytest.raises(SystemExit) as exit_:
+        ph.pipeout(df)
+    assert str(exit_.value).startswith("--float-format must be shortest")
+
+
+@pytest.mark.parametrize(
+    "cmd, expected",
+    [
+        ("eval d=c*2", "a,b,c,d\n1.10,NA,3,6\n2,,4,8\n"),
+        ("query c>3", "a,b,c\n2,,4\n"),
+        ("appendstr b x", "a,b,c\n1.10,nanx,3\n2,nanx,4\n"),
+        ("eval c*2", "c\n6\n8\n"),
+    ],
+)
+def test_lazy(capsys, monkeypatch, cmd, expected):
+    monkeypatch.setattr("sys.stdin", io.StringIO("a,b,c\n1.10,NA,3\n2,,4\n"))
+    _call(cmd, ["--lazy"])
+    assert capsys.readouterr().out == expected
+
+    # quoted fields are parsed as usual
+    monkeypatch.setattr("sys.stdin", io.StringIO('a,b,c\n1.10,"x",3\n'))
+    _call("round c --lazy")
+    assert capsys.readouterr().out == "a,b,c\n1.1,x,3\n"
+
+
 def test_polyfit(phmgr):
     with phmgr() as captured:
         _call("polyfit x y")
@@ -865,6 +1658,221 @@ def test_version(phmgr):
     assert captured.out == ph._version.__version__ + "\n"
 
 
+def _run_python(code, *args, **kwargs):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.run(
+        [sys.executable, "-c", code] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        cwd=root,
+        **kwargs
+    )
+
+
+def _imports_pandas(cmd, stdin=""):
+    # Runs ph in a fresh interpreter and reports whether pandas got imported
+    code = "\n".join(
+        [
+            "import sys, ph",
+            "try:",
+            "    ph._main(['ph'] + sys.argv[1:])",
+            "except SystemExit:",
+            "    pass",
+            "sys.stderr.write(str('pandas' in sys.modules))",
+        ]
+    )
+    proc = _run_python(code, *cmd.split(" "), input=stdin)
+    return proc.stderr == "True"
+
+
+def test_startup_without_pandas():
+    assert not _imports_pandas("help")
+    assert not _imports_pandas("help plot")
+    assert not _imports_pandas("--version")
+    assert not _imports_pandas("columns", stdin=_get_data("iris"))
+    assert _imports_pandas("head", stdin=_get_data("iris"))
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="ph serve needs fork")
+def test_serve_client(tmp_path):
+    sock = str(tmp_path / "ph.sock")
+    env = dict(os.environ, PH_SOCKET=sock)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen(
+        [sys.executable, "-c", "import ph; ph._main(['ph', 'serve'])"],
+        stderr=subprocess.PIPE,
+        env=env,
+        cwd=root,
+    )
+    try:
+        assert b"listening" in server.stderr.readline()
+        client = "import ph; ph.client()"
+
+        proc = _run_python(client, "head", "2", input=_get_data("a"), env=env)
+        assert proc.returncode == 0
+        assert proc.stdout == "x,y\n3,8\n4,9\n"
+
+        proc = _run_python(client, "open", "csv", "tests/test_data/a.csv", env=env)
+        assert proc.stdout == _get_data("a")
+
+        proc = _run_python(client, "nosuchcommand", env=env)
+        assert proc.returncode == 1
+        assert proc.stderr == "Unknown command nosuchcommand.\n"
+    finally:
+        server.terminate()
+        server.wait()
+    assert not os.path.exists(sock)
+
+    # without a server, the client runs the command itself
+    proc = _run_python("import ph; ph.client()", "shape", input=_get_data("a"), env=env)
+    assert proc.stdout == "rows,columns\n6,2\n"
+
+
+def _ph_process(args, env, **kwargs):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, "-m", "ph"] + args.split(" "),
+        env=env,
+        cwd=root,
+        **kwargs
+    )
+
+
+@pytest.mark.skipif(not __have_pyarrow(), reason="missing pyarrow")
+def test_wire_arrow(tmp_path):
+    env = dict(os.environ, PH_WIRE="arrow")
+    with open(_get_path("usa")) as fin:
+        first = _ph_process(
+            "date dateRep --dayfirst=True", env, stdin=fin, stdout=subprocess.PIPE
+        )
+        second = _ph_process("dtypes", env, stdin=first.stdout, stdout=subprocess.PIPE)
+        first.stdout.close()
+        out, _ = second.communicate()
+    first.wait()
+    dtypes = out.decode().splitlines()[1]
+    assert dtypes == "datetime64[ns],int64,int64,int64,int64,int64,object"
+
+    # the binary format is only written to pipes
+    with open(_get_path("a")) as fin:
+        with open(str(tmp_path / "out.csv"), "w") as fout:
+            _ph_process("head 2", env, stdin=fin, stdout=fout).wait()
+    with open(str(tmp_path / "out.csv")) as fin:
+        assert fin.read() == "x,y\n3,8\n4,9\n"
+
+    # and only by the stages that PH_WIRE is set on
+    with open(_get_path("a")) as fin:
+        first = _ph_process("head 2", None, stdin=fin, stdout=subprocess.PIPE)
+        out, _ = first.communicate()
+    assert out == b"x,y\n3,8\n4,9\n"
+
+
+def _wire_stdin(monkeypatch, df, rows):
+    import pyarrow
+
+    table = pyarrow.Table.from_pandas(df, preserve_index=False)
+    out = io.BytesIO()
+    out.write(ph._WIRE_MAGIC)
+    with pyarrow.ipc.new_stream(out, table.schema) as writer:
+        writer.write_table(table, max_chunksize=rows)
+    stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(out.getvalue())))
+    monkeypatch.setattr("sys.stdin", stdin)
+
+
+@pytest.mark.skipif(not __have_pyarrow(), reason="missing pyarrow")
+def test_wire_chunks(capsys, monkeypatch, options):
+    options["chunksize"] = 4
+    # a column of bools that has missing values only in the last batches
+    df = pd.DataFrame({"x": range(10), "b": [True] * 6 + [None, False, None, True]})
+
+    _wire_stdin(monkeypatch, df, 3)
+    chunks = list(ph._pipein_chunks())
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    pd.testing.assert_frame_equal(pd.concat(chunks).iloc[:, :1], df.iloc[:, :1])
+
+    _wire_stdin(monkeypatch, df, 3)
+    _call("tail 2")
+    assert capsys.readouterr().out == df.tail(2).to_csv(index=False)
+
+    _wire_stdin(monkeypatch, df, 3)
+    _call("head 3")
+    assert capsys.readouterr().out == df.head(3).to_csv(index=False)
+
+    # after the first chunk, all of the stream can still be read again
+    _wire_stdin(monkeypatch, df, 3)
+    replay = ph._Replay()
+    next(ph._pipein_chunks(replay))
+    pd.testing.assert_frame_equal(replay.frame(), df)
+
+
+@pytest.mark.parametrize("cmd", ["cat", "describe --chunksize=2"])
+def test_broken_pipe(cmd):
+    read, write = os.pipe()
+    os.close(read)  # the reader is gone before anything is written
+    with open(_get_path("usa")) as fin:
+        proc = _ph_process(cmd, None, stdin=fin, stdout=write, stderr=subprocess.PIPE)
+        os.close(write)
+        _, err = proc.communicate()
+    assert proc.returncode == 141
+    assert not err
+
+
+def test_schema(tmp_path):
+    env = dict(os.environ, PH_SCHEMA="1")
+    with open(_get_path("usa")) as fin:
+        first = _ph_process(
+            "date dateRep --dayfirst=True", env, stdin=fin, stdout=subprocess.PIPE
+        )
+        second = _ph_process("astype str", env, stdin=first.stdout, stdout=subprocess.PIPE)
+        third = _ph_process("dtypes", env, stdin=second.stdout, stdout=subprocess.PIPE)
+        first.stdout.close()
+        second.stdout.close()
+        out, _ = third.communicate()
+    first.wait()
+    second.wait()
+    assert out.decode().splitlines()[1] == ",".join(["object"] * 7)
+
+    # the last stage, without PH_SCHEMA, writes plain csv
+    with open(_get_path("usa")) as fin:
+        first = _ph_process(
+            "date dateRep --dayfirst=True", env, stdin=fin, stdout=subprocess.PIPE
+        )
+        second = _ph_process("tail 2", None, stdin=first.stdout, stdout=subprocess.PIPE)
+        first.stdout.close()
+        out, _ = second.communicate()
+    first.wait()
+    lines = out.decode().splitlines()
+    assert lines[0] == "dateRep,day,month,year,cases,deaths,geoId"
+    assert lines[1:] == ["2020-01-01,1,1,2020,0,0,US", "2019-12-31,31,12,2019,0,0,US"]
+
+    # and files never get the line
+    with open(_get_path("a")) as fin:
+        with open(str(tmp_path / "out.csv"), "w") as fout:
+            _ph_process("head 2", env, stdin=fin, stdout=fout).wait()
+    with open(str(tmp_path / "out.csv")) as fin:
+        assert fin.read() == "x,y\n3,8\n4,9\n"
+
+
+def test_write_schema(capfdbinary):
+    df = pd.DataFrame({"x": pd.to_datetime(["2020-01-01"]), "y": [1], "z": ["a"]})
+    ph._write_schema(df)
+    assert capfdbinary.readouterr().out == (
+        b'#ph:schema:{"x":"datetime64[ns]","y":"int64","z":"object"}\n'
+    )
+    ph._write_schema(df, exact=False)
+    assert capfdbinary.readouterr().out == (
+        b'#ph:schema:{"x":"datetime64[ns]","z":"object"}\n'
+    )
+
+
+def test_columns_header_only(phmgr):
+    with phmgr("slugit") as captured:
+        _call("columns")
+    assert not captured.err
+    expected = list(pd.read_csv(_get_path("slugit")).columns)
+    assert list(captured.df["columns"]) == expected
+
+
 def test_slugify_method():
     actexp = {
         "abc": "abc",
@@ -1086,3 +2094,55 @@ def test_spencer(phmgr):
     assert not captured.err
     captured.assert_shape(29, 10)
     captured.assert_columns(_COVID_COLS)
+
+
+def test_spencer_values(phmgr):
+    with phmgr("iris") as captured:
+        _call("spencer setosa")
+    assert not captured.err
+    df = pd.read_csv(_get_path("iris"))
+    weights = (-3, -6, -5, 3, 21, 46, 67, 74, 67, 46, 21, 3, -5, -6, -3)
+    expected = [
+        sum(df.setosa[i - 7 + j] * weights[j] / 320 for j in range(15))
+        for i in range(7, len(df) - 8)
+    ]
+    out = pd.read_csv(io.StringIO(captured.out), float_precision="round_trip")
+    assert list(out.setosa[7:-8]) == expected
+    assert out.setosa[:7].isna().all()
+    assert out.setosa[-8:].isna().all()
+    assert list(out.virginica) == list(df.virginica)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        "--kernel=spencer",
+        "setosa --kernel=henderson --window=5",
+        "--kernel=hann",
+        "setosa versicolor --weights=1,2,1",
+    ],
+)
+def test_smooth_chunks(args, capsys, monkeypatch, options):
+    outputs = []
+    for chunksize in (0, 1, 4):
+        options["chunksize"] = chunksize
+        monkeypatch.setattr("sys.stdin", _get_io("iris"))
+        _call("smooth " + args)
+        outputs.append(capsys.readouterr().out)
+    assert outputs[0] == outputs[1] == outputs[2]
+
+
+def test_smooth_kernels(phmgr):
+    with phmgr("iris") as captured:
+        _call("smooth setosa --kernel=henderson --window=5")
+    df = pd.read_csv(_get_path("iris"))
+    import numpy
+
+    # the 5-term Henderson weights
+    weights = [-21 / 286, 84 / 286, 160 / 286, 84 / 286, -21 / 286]
+    expected = numpy.convolve(df.setosa, weights, mode="valid")
+    assert list(captured.df.setosa[2:-2]) == pytest.approx(list(expected))
+
+    with phmgr("iris") as captured:
+        _call("smooth setosa --weights=1,1")
+    assert captured.df.setosa[1] == (df.setosa[0] + df.setosa[1]) / 2